@@ -0,0 +1,127 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import math
+import time
+
+import frappe
+from frappe import _
+from frappe.query_builder.functions import Count, Sum
+from frappe.utils import cint
+
+QUEUE_FULL_RETRY_AFTER = 60
+# KEYS: bucket, ARGV: rate, capacity, count, now, ttl
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens")) or capacity
+local updated_at = tonumber(redis.call("HGET", KEYS[1], "updated_at")) or now
+tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate)
+if count > tokens then
+    return math.ceil((count - tokens) / rate)
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens - count), "updated_at", tostring(now))
+redis.call("EXPIRE", KEYS[1], ARGV[5])
+return 0
+"""
+
+
+def get_backlog(instance):
+    log = frappe.qb.DocType("Books Integration Log")
+    pending_logs, pending_records = (
+        frappe.qb.from_(log)
+        .select(Count(log.name), Sum(log.record_count))
+        .where(log.books_instance == instance)
+        .where(log.processed == 0)
+        .run()
+    )[0]
+
+    return {
+        "pending_logs": cint(pending_logs),
+        "pending_records": cint(pending_records),
+    }
+
+
+def check_admission(instance, record_count, settings):
+    """Returns an error response if the instance may not push `record_count`
+    records right now, else None."""
+    return (
+        check_request_size(record_count, settings)
+        or check_queue_depth(instance, settings)
+        or check_rate_limit(instance, record_count, settings)
+    )
+
+
+def check_request_size(record_count, settings):
+    max_records = cint(settings.max_records_per_request)
+    if max_records and record_count > max_records:
+        return error_response(
+            413,
+            _("Request has {0} records, the limit is {1}. Split it into smaller requests.").format(
+                record_count, max_records
+            ),
+        )
+
+
+def check_queue_depth(instance, settings):
+    max_pending_logs = cint(settings.max_pending_logs)
+    if max_pending_logs:
+        backlog = get_backlog(instance)
+        if backlog["pending_logs"] >= max_pending_logs:
+            return error_response(
+                429,
+                _("Too many pending records for instance {0}").format(instance),
+                retry_after=QUEUE_FULL_RETRY_AFTER,
+                backlog=backlog,
+            )
+
+
+def check_rate_limit(instance, record_count, settings):
+    rate = cint(settings.rate_limit_records)
+    if rate:
+        capacity = cint(settings.rate_limit_burst) or rate
+        retry_after = consume_tokens(instance, record_count, rate / 60, capacity)
+        if retry_after:
+            return error_response(
+                429,
+                _("Rate limit exceeded for instance {0}").format(instance),
+                retry_after=retry_after,
+            )
+
+
+def consume_tokens(instance, count, rate, capacity):
+    """Token bucket per instance, refilled at `rate` tokens per second.
+
+    Returns the seconds to wait before `count` tokens are available,
+    0 if they were consumed. The bucket is read and updated in one script,
+    so concurrent requests cannot spend the same tokens."""
+    key = frappe.cache.make_key(f"books_sync_token_bucket|{instance}")
+    # a request larger than the bucket waits for a full bucket instead of forever
+    count = min(count, capacity)
+    return cint(
+        frappe.cache.eval(
+            TOKEN_BUCKET_SCRIPT,
+            1,
+            key,
+            repr(rate),
+            capacity,
+            count,
+            repr(time.time()),
+            math.ceil(capacity / rate),
+        )
+    )
+
+
+def error_response(status_code, message, retry_after=None, **kwargs):
+    frappe.local.response["http_status_code"] = status_code
+    response = {"success": False, "message": message, **kwargs}
+
+    if retry_after:
+        response["retry_after"] = retry_after
+        headers = getattr(frappe.local, "response_headers", None)
+        if headers is not None:
+            headers["Retry-After"] = str(retry_after)
+
+    return response
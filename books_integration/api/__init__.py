@@ -3,6 +3,9 @@
 
 import frappe
 from books_integration import __version__ as app_version
+from books_integration.metrics import get_metrics
+from books_integration.reference_cache import flush_reference_cache_metrics
+from books_integration.snapshot import get_latest_snapshot
 
 
 @frappe.whitelist(methods=["GET"])
@@ -10,10 +13,17 @@ def sync_settings():
     return {
         "success": True,
         "app_version": app_version,
-        "data": frappe.get_cached_doc("Books Sync Settings")
+        "data": frappe.get_cached_doc("Books Sync Settings").generate_sync_params()
     }
 
 
+@frappe.whitelist(methods=["GET"])
+def sync_metrics():
+    frappe.only_for("System Manager")
+    flush_reference_cache_metrics()
+    return {"success": True, "data": get_metrics()}
+
+
 @frappe.whitelist(methods=["POST"])
 def register_instance(instance, instance_name=None):
     if not instance:
@@ -29,6 +39,15 @@ def register_instance(instance, instance_name=None):
     }).insert(ignore_permissions=True)
 
     message = {"success": True, "message": "Instance registered successfully"}
+    if snapshot := get_latest_snapshot():
+        # the instance downloads it and acks the version instead of pulling
+        # every master from the queue
+        message["snapshot"] = {
+            "version": snapshot.name,
+            "built_at": snapshot.built_at,
+            "record_count": snapshot.record_count,
+        }
+
     books_sync_settings = frappe.get_single("Books Sync Settings")
     mappings = dict(
         tax_mapping = books_sync_settings.tax_mapping,
@@ -0,0 +1,48 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from books_integration.reconciliation import (
+    BUCKET_PREFIX_LENGTH,
+    get_child_digests,
+    get_digest_tree,
+    get_reconciled_doctypes,
+    reconcile_buckets,
+)
+
+
+@frappe.whitelist(methods=["GET"])
+def get_digests(instance, doctype=None, prefix=""):
+    """Without a doctype, returns the root digest of every outbound doctype
+    synced to the instance.
+    With one, returns the digests of the children of the node at `prefix`,
+    for the client to descend into the ones that differ from its own."""
+    if not frappe.db.exists("Books Instance", instance):
+        return {"success": False, "message": "Instance not registered"}
+
+    doctypes = get_reconciled_doctypes(instance)
+    if not doctype:
+        return {
+            "success": True,
+            "bucket_prefix_length": BUCKET_PREFIX_LENGTH,
+            "digests": {doctype: get_digest_tree(doctype)[""] for doctype in doctypes},
+        }
+
+    if doctype not in doctypes:
+        return {"success": False, "message": f"{doctype} is not synced to {instance}"}
+
+    if len(prefix or "") >= BUCKET_PREFIX_LENGTH:
+        return {"success": False, "message": f"Prefix {prefix} is a bucket"}
+
+    return {"success": True, "digests": get_child_digests(doctype, prefix or "")}
+
+
+@frappe.whitelist(methods=["POST"])
+def reconcile(instance, doctype, buckets):
+    """Takes the leaves the client holds in the buckets whose digests differ,
+    as {bucket: {erpnextDocName: erpnextModified}}."""
+    if not frappe.db.exists("Books Instance", instance):
+        return {"success": False, "message": "Instance not registered"}
+
+    result = reconcile_buckets(instance, doctype, frappe.parse_json(buckets))
+    return {"success": True, **result}
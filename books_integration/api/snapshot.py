@@ -0,0 +1,40 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from books_integration.snapshot import apply_snapshot, get_latest_snapshot
+
+
+@frappe.whitelist(methods=["GET"])
+def get_snapshot(instance):
+    if not frappe.db.exists("Books Instance", instance):
+        return {"success": False, "message": "Instance not registered"}
+
+    snapshot = get_latest_snapshot()
+    if not snapshot:
+        return {"success": False, "message": "No snapshot available"}
+
+    file_doc = frappe.get_doc("File", {"file_url": snapshot.snapshot_file})
+    frappe.local.response.filename = f"books-snapshot-{snapshot.name}.jsonl.gz"
+    frappe.local.response.filecontent = file_doc.get_content()
+    frappe.local.response.type = "download"
+
+
+@frappe.whitelist(methods=["POST"])
+def ack_snapshot(instance, version):
+    """Called once the instance has loaded the snapshot, so the queue only
+    carries what changed after it was built."""
+    if not frappe.db.exists("Books Instance", instance):
+        return {"success": False, "message": "Instance not registered"}
+
+    snapshot = frappe.db.get_value(
+        "Books Snapshot",
+        {"name": version, "status": "Ready"},
+        ["name", "built_at"],
+        as_dict=True,
+    )
+    if not snapshot:
+        return {"success": False, "message": f"Snapshot {version} not available"}
+
+    apply_snapshot(instance, snapshot)
+    return {"success": True}
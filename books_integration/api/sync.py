@@ -1,26 +1,45 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
-from frappe.utils import create_batch, today
+from frappe import _
+from frappe.utils import cint, create_batch, now_datetime, today
+from books_integration.admission import (
+    check_admission, check_queue_depth, check_rate_limit, check_request_size,
+    error_response, get_backlog
+)
+from books_integration.batching import get_batch_priority, iter_record_batches
+from books_integration.delta import get_outbound_record, pop_sent_hashes
 from books_integration.doc_converter import init_doc_converter
-from books_integration.utils import get_doctype_name, update_books_reference, pretty_json
+from books_integration.metrics import incr
+from books_integration.reconciliation import add_reconciliation_keys
+from books_integration.reference_cache import get_erpn_reference, get_reference_doctypes
+from books_integration.scheduler import enqueue_process_transactions
+from books_integration.schema import validate_record
+from books_integration.sync_queue import acknowledge_queued_doc, lease_queued_docs
+from books_integration.utils import (
+    get_doctype_name, update_books_reference, compress_payload, get_payload_hash,
+    decode_chunks, iter_json_records, PAYLOAD_CHUNK_SIZE
+)
 from frappe.query_builder.functions import IfNull, Max
 
+# records validated and deduplicated together while streaming a request body
+STREAM_CHUNK_SIZE = 500
+
 
 @frappe.whitelist(methods=["GET"])
-def get_pending_docs(instance):
+def get_pending_docs(instance, patches=0):
+    """With `patches`, records Books has acknowledged before are sent as
+    patches of the fields changed since."""
     item_rates = get_item_rates()
     if not item_rates:
         return {
             "success": False,
             "message": "price list not selected in Books Sync Settings"
         }
-    queued_docs = frappe.db.get_all(
-        "Books Sync Queue",
-        filters={"books_instance": instance},
-        fields=["name", "document_type", "document_name", "books_instance"]
-    )
+    queued_docs = lease_queued_docs(instance)
 
     if not queued_docs:
         return {"success": True, "data": []}
@@ -30,28 +49,27 @@ def get_pending_docs(instance):
         doc = frappe.get_doc(
             queued_doc.document_type, queued_doc.document_name
         )
-        existing_books_ref = frappe.db.get_value(
-            "Books Reference",
-            {
-                "document_type": queued_doc.doctype_name,
-                "document_name": queued_doc.document_name,
-            },
-            "books_name"
+        existing_books_ref = get_erpn_reference(
+            queued_doc.books_instance, queued_doc.document_type, queued_doc.document_name
         )
         doc_converter_obj = init_doc_converter(
             queued_doc.books_instance, doc, "fbooks"
         )
         if not doc_converter_obj:
+            # nothing to send, it would stay leased and be handed out again
+            frappe.db.delete("Books Sync Queue", queued_doc.name)
+            frappe.local.flags.commit = True
             continue
         compatable_doc = doc_converter_obj.get_converted_doc()
 
         if existing_books_ref:
-            compatable_doc["fbooksDocName"] = existing_books_ref
+            compatable_doc["fbooksDocName"] = existing_books_ref.books_name
 
         compatable_doc["books_sync_id"] = queued_doc.name
+        add_reconciliation_keys(compatable_doc, doc)
         if compatable_doc.get("doctype") == "Item":
             compatable_doc["rate"] = item_rates.get(compatable_doc.get("itemCode"), 0)
-        docs.append(compatable_doc)
+        docs.append(get_outbound_record(compatable_doc, existing_books_ref, cint(patches)))
 
     return {"success": True, "data": docs}
 
@@ -111,27 +129,142 @@ def sync_transactions(instance, records):
         "success": False,
         "message": "Please Set Mode of Payment Mapping in Books Sync Settings",
     }
-    batches = create_batch(records, 15)
-    for batch in batches:
-        doc = frappe.new_doc("Books Integration Log")
-        doc.books_instance = instance
-        doc.data = pretty_json(batch)
-        doc.save(ignore_permissions=True)
-
-    frappe.enqueue(
-        "books_integration.scheduler.process_transactions",
-        queue="long",
-        enqueue_after_commit=True,
-        job_id="BOOKS_SYNC_TRANSACTION_JOB",
-        deduplicate=True
+    if rejection := check_admission(instance, len(records), settings):
+        return rejection
+
+    records, invalid = split_invalid_records(records)
+    if invalid:
+        incr("inbound.invalid", len(invalid))
+    records, duplicates = split_duplicate_records(instance, records)
+    if duplicates:
+        incr("inbound.duplicates", len(duplicates))
+    lanes = set()
+    sync_time = now_datetime()
+    for lane, batch in iter_record_batches(records, settings):
+        save_record_batch(instance, lane, batch, sync_time)
+        lanes.add(lane)
+
+    for lane in lanes:
+        enqueue_process_transactions(lane)
+
+    return {
+        "success": True,
+        "message": "Books Integration Log created successfully",
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "backlog": get_backlog(instance),
+    }
+
+
+@frappe.whitelist(methods=["POST"])
+def stream_transactions(instance):
+    """Accepts records as a JSON array or newline delimited JSON in the
+    request body, sent as application/x-ndjson with `instance` in the
+    query string. Frappe buffers the body before the method runs; the
+    records are parsed from it and stored batch by batch, so the parsed
+    records are never all held at once."""
+    settings = frappe.get_doc("Books Sync Settings")
+    if not settings.get("mode_of_payment_mapping"):
+        return {
+        "success": False,
+        "message": "Please Set Mode of Payment Mapping in Books Sync Settings",
+    }
+    if rejection := check_queue_depth(instance, settings):
+        return rejection
+
+    body = frappe.request.get_data()
+    if rejection := check_request_body(body):
+        return rejection
+
+    stats = frappe._dict(
+        records=0, invalid=[], duplicates=[], seen=get_pending_hashes(instance)
     )
+    records = iter_new_records(instance, iter_json_records(iter_request_body(body)), stats)
+    lanes = set()
+    sync_time = now_datetime()
+    try:
+        for lane, batch in iter_record_batches(records, settings):
+            if rejection := check_request_size(stats.records, settings):
+                frappe.db.rollback()
+                return rejection
+
+            save_record_batch(instance, lane, batch, sync_time)
+            lanes.add(lane)
+    except json.JSONDecodeError as e:
+        frappe.db.rollback()
+        return error_response(400, _("Invalid JSON in request body: {0}").format(e))
+
+    if not stats.records:
+        return error_response(400, _("No records in request body"))
+
+    if rejection := check_rate_limit(instance, stats.records, settings):
+        frappe.db.rollback()
+        return rejection
+
+    if stats.invalid:
+        incr("inbound.invalid", len(stats.invalid))
+    if stats.duplicates:
+        incr("inbound.duplicates", len(stats.duplicates))
+    for lane in lanes:
+        enqueue_process_transactions(lane)
 
     return {
         "success": True,
         "message": "Books Integration Log created successfully",
+        "records": stats.records,
+        "duplicates": stats.duplicates,
+        "invalid": stats.invalid,
+        "backlog": get_backlog(instance),
     }
 
 
+def check_request_body(body):
+    body = body.strip()
+    if not body:
+        return error_response(400, _("Request body is empty"))
+
+    # a cut off array can end on a complete record
+    if body.startswith(b"[") and not body.endswith(b"]"):
+        return error_response(400, _("Request body is truncated"))
+
+
+def iter_request_body(body):
+    view = memoryview(body)
+    yield from decode_chunks(
+        bytes(view[start:start + PAYLOAD_CHUNK_SIZE])
+        for start in range(0, len(view), PAYLOAD_CHUNK_SIZE)
+    )
+
+
+def iter_new_records(instance, records, stats):
+    """Yields the valid records not applied before or earlier in the
+    request, counting the parsed, invalid and duplicate ones in `stats`."""
+    for chunk in create_batch(records, STREAM_CHUNK_SIZE):
+        stats.records += len(chunk)
+        chunk, invalid = split_invalid_records(chunk)
+        chunk, duplicates = split_duplicate_records(instance, chunk, stats.seen)
+        stats.invalid.extend(invalid)
+        stats.duplicates.extend(duplicates)
+        yield from chunk
+
+
+def save_record_batch(instance, lane, batch, sync_time=None):
+    doc = frappe.new_doc("Books Integration Log")
+    doc.books_instance = instance
+    doc.sync_time = sync_time or now_datetime()
+    doc.lane = lane
+    doc.record_count = len(batch)
+    doc.priority = get_batch_priority(batch)
+    doc.data = compress_payload(batch)
+    doc.record_hashes = "\n".join(get_payload_hash(record) for record in batch)
+    doc.save(ignore_permissions=True)
+
+
+@frappe.whitelist(methods=["GET"])
+def get_sync_status(instance):
+    return {"success": True, "backlog": get_backlog(instance)}
+
+
 @frappe.whitelist(methods=["POST"])
 def update_status(instance, data):
     ref_data = {
@@ -139,11 +272,14 @@ def update_status(instance, data):
         "name": data.get("nameInERPNext"),
         "books_name": data.get("nameInFBooks"),
         "doc": data.get("doc"),
+        "field_hashes": pop_sent_hashes(
+            data.get("doc").get("books_sync_id"), data.get("doc").get("sentHash")
+        ),
     }
 
     update_books_reference(instance, ref_data)
     try:
-        frappe.get_doc("Books Sync Queue", data.get('doc').get("books_sync_id")).delete()
+        acknowledge_queued_doc(data.get('doc').get("books_sync_id"))
     except Exception:
         frappe.log_error(
             title=f"Books Integration Error - {instance} - Update Status",
@@ -184,4 +320,82 @@ def get_item_rates():
         .where(item_price.price_list == price_list)
         .run()
     )
-    return dict(item_rates) or {}
\ No newline at end of file
+    return dict(item_rates) or {}
+
+
+def split_invalid_records(records):
+    """Rejects records that would fail conversion before anything is stored."""
+    valid_records = []
+    invalid = []
+    for record in records:
+        if errors := validate_record(record):
+            invalid.append({
+                "doctype": record.get("doctype") if isinstance(record, dict) else None,
+                "name": record.get("name") if isinstance(record, dict) else None,
+                "errors": errors,
+            })
+            continue
+
+        valid_records.append(record)
+
+    return valid_records, invalid
+
+
+def split_duplicate_records(instance, records, seen=None):
+    """Separates records that were already applied with the same content,
+    are waiting in a pending log of the instance, or are repeated within
+    the request, from the ones to be processed. `seen` carries the payload
+    hashes of a request split across calls, starting from the pending ones."""
+    seen = get_pending_hashes(instance) if seen is None else seen
+    names_by_doctype = {}
+    for record in records:
+        doctype = get_doctype_name(record.get("doctype"), "erpn", record)
+        names_by_doctype.setdefault(doctype, []).append(record.get("name"))
+
+    applied_hashes = set()
+    for doctype, names in names_by_doctype.items():
+        applied_refs = frappe.db.get_all(
+            "Books Reference",
+            filters={
+                "document_type": ("in", get_reference_doctypes(doctype)),
+                "books_instance": instance,
+                "books_name": ("in", names),
+                "payload_hash": ("is", "set"),
+            },
+            fields=["books_name", "payload_hash"],
+        )
+        applied_hashes.update(
+            (doctype, ref.books_name, ref.payload_hash) for ref in applied_refs
+        )
+
+    new_records = []
+    duplicates = []
+    for record in records:
+        payload_hash = get_payload_hash(record)
+        fingerprint = (
+            get_doctype_name(record.get("doctype"), "erpn", record),
+            record.get("name"),
+            payload_hash,
+        )
+        if fingerprint in applied_hashes or payload_hash in seen:
+            duplicates.append({"doctype": record.get("doctype"), "name": record.get("name")})
+            continue
+
+        seen.add(payload_hash)
+        new_records.append(record)
+
+    return new_records, duplicates
+
+
+def get_pending_hashes(instance):
+    """Returns the payload hashes of the records in the instance's logs
+    that are not processed yet, so a resend after a timeout is caught."""
+    hashes = set()
+    for record_hashes in frappe.get_all(
+        "Books Integration Log",
+        filters={"books_instance": instance, "processed": 0},
+        pluck="record_hashes",
+    ):
+        hashes.update((record_hashes or "").split())
+
+    return hashes
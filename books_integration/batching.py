@@ -0,0 +1,94 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import cint, flt
+
+RECORD_COST_CACHE_KEY = "books_sync_record_cost"
+PRIORITY_DOCTYPES = ("POSOpeningShift", "POSClosingShift")
+FINANCIAL_LANE = "Financial"
+MASTER_LANE = "Master"
+LANES = (FINANCIAL_LANE, MASTER_LANE)
+# parties and addresses stay in the financial lane as invoices depend on them
+MASTER_DOCTYPES = (
+    "Item",
+    "ItemGroup",
+    "PricingRule",
+    "PriceList",
+    "PriceListItem",
+    "UOM",
+    "UOMConversionItem",
+    "Batch",
+    "SerialNumber",
+)
+# seconds per line used until processing times have been measured
+DEFAULT_LINE_COST = {
+    "SalesInvoice": 0.3,
+    "Payment": 0.3,
+    "Shipment": 0.3,
+    "StockMovement": 0.3,
+    "POSOpeningShift": 0.3,
+    "POSClosingShift": 1.0,
+}
+DEFAULT_RECORD_LINE_COST = 0.05
+COST_SMOOTHING = 0.2
+
+
+def iter_record_batches(records, settings):
+    """Yields `(lane, batch)` as soon as a batch is full, keeping one open
+    batch per lane and priority so `records` can be consumed lazily."""
+    adaptive = settings.adaptive_batching
+    limit = (
+        flt(settings.target_batch_duration) or 30
+        if adaptive
+        else cint(settings.inbound_batch_size) or 15
+    )
+
+    open_batches = {}
+    for record in records:
+        key = (get_record_lane(record), record.get("doctype") in PRIORITY_DOCTYPES)
+        batch = open_batches.setdefault(key, frappe._dict(records=[], cost=0))
+        cost = get_record_cost(record) if adaptive else 1
+        if batch.records and batch.cost + cost > limit:
+            yield key[0], batch.records
+            batch.records = []
+            batch.cost = 0
+
+        batch.records.append(record)
+        batch.cost += cost
+
+    for (lane, _priority), batch in open_batches.items():
+        if batch.records:
+            yield lane, batch.records
+
+
+def get_record_lane(record):
+    return MASTER_LANE if record.get("doctype") in MASTER_DOCTYPES else FINANCIAL_LANE
+
+
+def get_batch_priority(batch):
+    return int(any(row.get("doctype") in PRIORITY_DOCTYPES for row in batch))
+
+
+def get_line_count(record):
+    return max(1, sum(len(value) for value in record.values() if isinstance(value, list)))
+
+
+def get_record_cost(record):
+    doctype = record.get("doctype")
+    line_cost = frappe.cache.hget(RECORD_COST_CACHE_KEY, doctype)
+    if line_cost is None:
+        line_cost = DEFAULT_LINE_COST.get(doctype, DEFAULT_RECORD_LINE_COST)
+
+    return line_cost * get_line_count(record)
+
+
+def update_record_cost(record, duration):
+    """Moves the cost per line of the record's doctype towards the measured one."""
+    doctype = record.get("doctype")
+    measured = duration / get_line_count(record)
+    line_cost = frappe.cache.hget(RECORD_COST_CACHE_KEY, doctype)
+    if line_cost is not None:
+        measured = line_cost + COST_SMOOTHING * (measured - line_cost)
+
+    frappe.cache.hset(RECORD_COST_CACHE_KEY, doctype, measured)
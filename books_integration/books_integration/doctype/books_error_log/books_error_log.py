@@ -2,15 +2,21 @@
 # For license information, please see license.txt
 
 import frappe
-import json
 from frappe.model.document import Document
 from books_integration.scheduler import process_data
+from books_integration.utils import compress_payload, load_payload, pretty_json
 
 
 class BooksErrorLog(Document):
+	def validate(self):
+		self.data = compress_payload(self.data)
+
+	def onload(self):
+		self.data = pretty_json(load_payload(self.data))
+
 	@frappe.whitelist()
 	def retry_processing(self):
-		data = json.loads(self.data)
+		data = load_payload(self.data)
 		process_data(
 			self.books_instance, data, self.document_type
 		)
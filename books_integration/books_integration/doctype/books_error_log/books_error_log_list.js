@@ -0,0 +1,40 @@
+// Copyright (c) 2026, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Books Error Log"] = {
+	onload(listview) {
+		listview.page.add_inner_button(__("Retry in Background"), function () {
+			const dialog = new frappe.ui.Dialog({
+				title: __("Retry Books Error Logs"),
+				fields: [
+					{
+						fieldname: "books_instance",
+						fieldtype: "Link",
+						label: __("Books Instance"),
+						options: "Books Instance",
+					},
+					{
+						fieldname: "document_type",
+						fieldtype: "Link",
+						label: __("Document Type"),
+						options: "DocType",
+					},
+					{
+						fieldname: "error_fingerprint",
+						fieldtype: "Data",
+						label: __("Error Fingerprint"),
+					},
+				],
+				primary_action_label: __("Retry"),
+				primary_action(values) {
+					frappe.call({
+						method: "books_integration.scheduler.retry.enqueue_error_log_retry",
+						args: values,
+					});
+					dialog.hide();
+				},
+			});
+			dialog.show();
+		});
+	},
+};
@@ -0,0 +1,29 @@
+// Copyright (c) 2026, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Books Error Summary", {
+	refresh(frm) {
+		const open_error_logs = frm.doc.__onload?.open_error_logs || 0;
+		frm.dashboard.set_headline(__("{0} open Books Error Logs", [open_error_logs]));
+
+		frm.add_custom_button(__("View Error Logs"), function () {
+			frappe.set_route("List", "Books Error Log", {
+				error_fingerprint: frm.doc.name,
+			});
+		});
+
+		if (!open_error_logs) {
+			return;
+		}
+
+		frm.add_custom_button(__("Retry All"), function () {
+			frm.call("retry_error_logs");
+		}, __("Actions"));
+
+		frm.add_custom_button(__("Delete Error Logs"), function () {
+			frappe.confirm(__("Delete all Books Error Logs with this fingerprint?"), function () {
+				frm.call("delete_error_logs").then(() => frm.reload_doc());
+			});
+		}, __("Actions"));
+	},
+});
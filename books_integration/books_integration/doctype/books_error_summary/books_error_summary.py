@@ -0,0 +1,29 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from books_integration.scheduler.retry import enqueue_error_log_retry
+from books_integration.utils import compress_payload, load_payload, pretty_json
+
+
+class BooksErrorSummary(Document):
+	def validate(self):
+		self.sample_data = compress_payload(self.sample_data)
+
+	def onload(self):
+		self.sample_data = pretty_json(load_payload(self.sample_data))
+		self.set_onload(
+			"open_error_logs",
+			frappe.db.count("Books Error Log", {"error_fingerprint": self.name}),
+		)
+
+	@frappe.whitelist()
+	def retry_error_logs(self):
+		enqueue_error_log_retry(error_fingerprint=self.name)
+
+	@frappe.whitelist()
+	def delete_error_logs(self):
+		frappe.only_for("System Manager")
+		frappe.db.delete("Books Error Log", {"error_fingerprint": self.name})
+		frappe.msgprint(frappe._("Books Error Logs deleted"))
@@ -3,7 +3,12 @@
 
 # import frappe
 from frappe.model.document import Document
+from books_integration.sync_queue import clear_sync_decisions
 
 
 class BooksInstance(Document):
-	pass
+	def on_update(self):
+		clear_sync_decisions()
+
+	def on_trash(self):
+		clear_sync_decisions()
@@ -3,7 +3,12 @@
 
 # import frappe
 from frappe.model.document import Document
+from books_integration.utils import compress_payload, load_payload, pretty_json
 
 
 class BooksIntegrationLog(Document):
-	pass
+	def validate(self):
+		self.data = compress_payload(self.data)
+
+	def onload(self):
+		self.data = pretty_json(load_payload(self.data))
@@ -1,9 +1,22 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from books_integration.reference_cache import reference_changed
 
 
 class BooksReference(Document):
-	pass
+	def on_update(self):
+		reference_changed(self.books_instance, *filter(None, (self, self.get_doc_before_save())))
+
+	def on_trash(self):
+		reference_changed(self.books_instance, self)
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Books Reference",
+		["document_type", "document_name", "books_instance"],
+		constraint_name="unique_books_reference",
+	)
@@ -0,0 +1,12 @@
+// Copyright (c) 2026, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Books Resync Job", {
+	refresh(frm) {
+		if (frm.doc.status === "Failed") {
+			frm.add_custom_button(__("Resume"), () => {
+				frm.call("resume").then(() => frm.reload_doc());
+			});
+		}
+	},
+});
@@ -0,0 +1,20 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from books_integration.resync import enqueue_resync_job
+
+
+class BooksResyncJob(Document):
+	def after_insert(self):
+		enqueue_resync_job(self.name)
+
+	@frappe.whitelist()
+	def resume(self):
+		frappe.only_for("System Manager")
+		if self.status != "Failed":
+			frappe.throw(frappe._("Only failed jobs can be resumed"))
+
+		self.db_set({"status": "Queued", "error": None})
+		enqueue_resync_job(self.name)
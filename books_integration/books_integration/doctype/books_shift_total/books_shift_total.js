@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Books Shift Total", {
+// 	refresh(frm) {
+
+// 	},
+// });
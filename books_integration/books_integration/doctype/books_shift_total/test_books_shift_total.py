@@ -0,0 +1,57 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from books_integration.shift_totals import add_shift_total, get_shift_totals, update_shift_totals
+
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record depdendencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+class TestBooksShiftTotal(UnitTestCase):
+	"""
+	Unit tests for BooksShiftTotal.
+	Use this class for testing individual functions and methods.
+	"""
+
+	pass
+
+
+class TestBooksShiftTotal(IntegrationTestCase):
+	"""
+	Integration tests for BooksShiftTotal.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_totals_are_added_up(self):
+		add_shift_total("_Test Books Shift", None, "Cash", 100)
+		add_shift_total("_Test Books Shift", None, "Cash", 50)
+		add_shift_total("_Test Books Shift", None, "Cash", -30, -1)
+
+		self.assertEqual(get_shift_totals("_Test Books Shift"), {"Cash": 120})
+		self.assertEqual(
+			frappe.db.get_value("Books Shift Total", {"pos_opening_entry": "_Test Books Shift"}, "payment_count"),
+			1,
+		)
+
+	def test_consolidated_invoices_are_not_counted(self):
+		invoice = frappe._dict(
+			doctype="Sales Invoice",
+			from_frappebooks=1,
+			books_instance="_Test Books Instance",
+			books_pos_opening_entry="_Test Books Shift",
+			is_consolidated=1,
+			payments=[frappe._dict(mode_of_payment="Cash", amount=100)],
+		)
+
+		update_shift_totals(invoice, "on_submit")
+
+		self.assertFalse(get_shift_totals("_Test Books Shift"))
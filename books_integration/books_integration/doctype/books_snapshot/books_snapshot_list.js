@@ -0,0 +1,13 @@
+// Copyright (c) 2026, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Books Snapshot"] = {
+	onload(listview) {
+		listview.page.add_inner_button(__("Build Snapshot"), function () {
+			frappe.call({
+				method: "books_integration.snapshot.enqueue_snapshot_build",
+				callback: () => listview.refresh(),
+			});
+		});
+	},
+};
@@ -3,9 +3,13 @@
 
 # import frappe
 from frappe.model.document import Document
+from books_integration.sync_queue import clear_sync_decisions
 
 
 class BooksSyncSettings(Document):
+	def on_update(self):
+		clear_sync_decisions()
+
 	def generate_sync_params(self):
 		data = self.as_dict()
 
@@ -22,8 +26,9 @@ class BooksSyncSettings(Document):
 			"Delivery Note": ["sync_delivery_note", "delivery_note_sync_type"],
 		}
 
+		# without any rows every document is synced
 		for (sync, sync_type) in sync_params.values():
-			data[sync] = 0
+			data[sync] = 0 if self.sync_docs else 1
 			data[sync_type] = "Two Way"
 
 		for row in self.sync_docs:
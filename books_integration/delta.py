@@ -0,0 +1,73 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from books_integration.utils import compact_json, get_payload_hash
+
+# sent with every record, so a patch can be matched to the Books record and
+# acknowledged, and never compared
+PATCH_KEYS = (
+    "doctype", "fbooksDocName", "books_sync_id", "erpnextDocName", "erpnextModified", "sentHash"
+)
+FIELD_HASH_LENGTH = 16
+# how long the hashes of a sent record wait for its acknowledgement
+SENT_HASHES_TTL = 7 * 24 * 60 * 60
+
+
+def get_field_hashes(record):
+    return {
+        field: get_payload_hash(value)[:FIELD_HASH_LENGTH]
+        for field, value in record.items()
+        if field not in PATCH_KEYS
+    }
+
+
+def make_patch(record, field_hashes, base_hashes):
+    """Returns a patch with the fields of the record that changed since the
+    base Books acknowledged, and the ones it no longer has set to None."""
+    patch = {field: record[field] for field in PATCH_KEYS if field in record}
+    patch.update(
+        (field, record[field])
+        for field, field_hash in field_hashes.items()
+        if base_hashes.get(field) != field_hash
+    )
+    patch.update((field, None) for field in base_hashes if field not in field_hashes)
+    patch["isPatch"] = 1
+    return patch
+
+
+def get_outbound_record(record, reference, patches=False):
+    """Returns the record to send, a patch when the client takes them and
+    the fields it last acknowledged are known, and remembers the hashes of
+    the full record until the client acknowledges this version of it. The
+    version is a hash of the sent content, as changes such as an item's
+    rate leave the document's modified time as it was."""
+    field_hashes = get_field_hashes(record)
+    record["sentHash"] = get_payload_hash(field_hashes)[:FIELD_HASH_LENGTH]
+    frappe.cache.set_value(
+        _get_sent_key(record["books_sync_id"], record["sentHash"]),
+        field_hashes,
+        expires_in_sec=SENT_HASHES_TTL,
+    )
+
+    base_hashes = reference and reference.get("field_hashes")
+    if not patches or not base_hashes:
+        return record
+
+    return make_patch(record, field_hashes, frappe.parse_json(base_hashes))
+
+
+def pop_sent_hashes(books_sync_id, sent_hash=None):
+    """Returns the field hashes of the acknowledged version of a record,
+    serialized for its Books Reference, or None if they are no longer
+    known. A queue row sent again after the document changed holds the
+    hashes of each version, so a late ack of the older one cannot store
+    the newer one's hashes."""
+    key = _get_sent_key(books_sync_id, sent_hash)
+    field_hashes = frappe.cache.get_value(key)
+    frappe.cache.delete_value(key)
+    return compact_json(field_hashes) if field_hashes else None
+
+
+def _get_sent_key(books_sync_id, sent_hash=None):
+    return f"books_sent_fields|{books_sync_id}|{sent_hash or ''}"
@@ -7,19 +7,27 @@ from frappe.model.document import Document
 from frappe.utils import (
     flt, getdate, get_datetime_str, convert_utc_to_system_timezone, get_datetime
 )
-from books_integration.utils import get_doctype_name
+from frappe.query_builder.functions import IfNull
+from books_integration.reference_cache import get_books_reference
+from books_integration.shift_totals import get_shift_totals
+from books_integration.utils import get_doctype_name, get_invoice_doctype
 from erpnext.accounts.doctype.journal_entry.journal_entry import get_default_bank_cash_account
 from erpnext.accounts.party import get_party_account
 
 
 class DocConverterBase:
-    def __init__(self, instance, dirty_doc, target: str) -> None:
+    # fields of the Books record that inbound records must have
+    required_fields = ("name",)
+    required_child_fields = {}
+
+    def __init__(self, instance, dirty_doc, target: str, lookups=None) -> None:
         self.doc_dict = dirty_doc
         if isinstance(self.doc_dict, Document):
             self.doc_dict = dirty_doc.as_dict()
 
         self.instance = instance
-        self.field_map = getattr(self, 'field_map', {}) # Initialized by subclasses or empty dict
+        # Copied as subclasses declare field_map on the class
+        self.field_map = dict(getattr(self, 'field_map', {}))
         self.converted_doc = {}
         self._dirty_doc = dirty_doc
         self.target = target
@@ -31,6 +39,8 @@ class DocConverterBase:
         self.doc_can_submit = True
         self.is_dict = isinstance(dirty_doc, dict)
         self.settings = frappe.get_cached_doc("Books Sync Settings")
+        # values read ahead for a page of documents, see snapshot.get_page_lookups
+        self.lookups = lookups or {}
 
         if self.target == "erpn":
             # Deep copy child_tables to prevent modifying the original class-level field_map
@@ -114,6 +124,11 @@ class DocConverterBase:
 
         return frappe.get_doc(self.converted_doc)
 
+    def get_erp_reference_name(self, books_name, document_type=None):
+        """Returns the name of the ERPNext document synced from a Books record."""
+        reference = get_books_reference(self.instance, books_name, document_type)
+        return reference.document_name if reference else None
+
     def get_erp_payment_method(self, payment_method):
         methods = self.settings.get("mode_of_payment_mapping")
         if not methods:
@@ -191,84 +206,89 @@ class DocConverterBase:
         frappe.throw(_(f"ERPNext Item Code for '{fbooks_item_name}' not found in mapping or does not exist in ERPNext."))
 
 
-def init_doc_converter(instance, doc_dict, target: str):
-    doctype = doc_dict.get("doctype")
+def init_doc_converter(instance, doc_dict, target: str, lookups=None):
+    converter = get_converter_class(doc_dict.get("doctype"))
+    if not converter:
+        return False
+
+    return converter(instance, doc_dict, target, lookups)
+
+
+def get_converter_class(doctype):
     if doctype == "Item":
-        return Item(instance, doc_dict, target)
+        return Item
 
     if doctype == "Customer":
-        return Customer(instance, doc_dict, target)
+        return Customer
 
     if doctype == "Supplier":
-        return Supplier(instance, doc_dict, target)
+        return Supplier
 
     if doctype in ("Sales Invoice", "SalesInvoice",):
-        return SalesInvoice(instance, doc_dict, target)
+        return SalesInvoice
 
     if doctype in ("Payment Entry", "Payment",):
-        return PaymentEntry(instance, doc_dict, target)
+        return PaymentEntry
 
     if doctype in ("Stock Entry", "StockMovement",):
-        return StockEntry(instance, doc_dict, target)
+        return StockEntry
 
     if doctype in ("Price List", "PriceList",):
-        return PriceList(instance, doc_dict, target)
+        return PriceList
 
     if doctype in ("Serial No", "SerialNumber",):
-        return SerialNumber(instance, doc_dict, target)
+        return SerialNumber
 
     if doctype == "Batch":
-        return Batch(instance, doc_dict, target)
+        return Batch
 
     if doctype == "UOM":
-        return UOM(instance, doc_dict, target)
+        return UOM
 
     if doctype in ("UOM Conversion Detail", "UOMConversionItem"):
-        return UOMConversionDetail(instance, doc_dict, target)
+        return UOMConversionDetail
 
     if doctype in ("Delivery Note", "Shipment"):
-        return DeliveryNote(instance, doc_dict, target)
+        return DeliveryNote
 
     if doctype == "Address":
-        return Address(instance, doc_dict, target)
+        return Address
 
     if doctype == "POSOpeningShift":
-        return POSOpeningShift(instance, doc_dict, target)
+        return POSOpeningShift
 
     if doctype == "POSClosingShift":
-        return POSClosingShift(instance, doc_dict, target)
+        return POSClosingShift
 
     if doctype == "Pricing Rule":
-        return PricingRule(instance, doc_dict, target)
+        return PricingRule
 
     if doctype == "Item Group":
-        return ItemGroup(instance, doc_dict, target)
+        return ItemGroup
     return False
 
 
 class Item(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "image": "image",
-            "item_code": "itemCode",
-            "item_name": "name",
-            "stock_uom": "unit",
-            "description": "description",
-            "gst_hsn_code": "hsnCode",
-            "is_stock_item": "trackItem",
-            "has_batch_no": "hasBatch",
-            "has_serial_no": "hasSerialNumber",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "uoms",
-                    "fbooks_fieldname": "uomConversions",
-                    "fbooks_doctype": "UOMConversionItem",
-                    "erpn_doctype": "UOM Conversion Detail",
-                    "fieldmap": {"uom": "uom", "conversion_factor": "conversionFactor"},
-                }
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "image": "image",
+        "item_code": "itemCode",
+        "item_name": "name",
+        "stock_uom": "unit",
+        "description": "description",
+        "gst_hsn_code": "hsnCode",
+        "is_stock_item": "trackItem",
+        "has_batch_no": "hasBatch",
+        "has_serial_no": "hasSerialNumber",
+        "child_tables": [
+            {
+                "erpn_fieldname": "uoms",
+                "fbooks_fieldname": "uomConversions",
+                "fbooks_doctype": "UOMConversionItem",
+                "erpn_doctype": "UOM Conversion Detail",
+                "fieldmap": {"uom": "uom", "conversion_factor": "conversionFactor"},
+            }
+        ],
+    }
 
 
     def _fill_missing_values_for_fbooks(self):
@@ -283,9 +303,11 @@ class Item(DocConverterBase):
         if barcodes := self.doc_dict.get("barcodes"):
             self.converted_doc['barcode'] = barcodes[0].get("barcode")
 
-        all_uoms = frappe.db.get_all(
-            "UOM", filters={"must_be_whole_number": 1}, pluck="name"
-        )
+        all_uoms = self.lookups.get("whole_uoms")
+        if all_uoms is None:
+            all_uoms = frappe.db.get_all(
+                "UOM", filters={"must_be_whole_number": 1}, pluck="name"
+            )
         for row in self.converted_doc["uomConversions"]:
             if row.get("uom") in all_uoms:
                 row.setdefault("isWhole", True)
@@ -319,26 +341,16 @@ class Item(DocConverterBase):
 
 
 class Customer(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "gstin": "gstin",
-            "gst_category": "gstType",
-            "customer_primary_address": "address",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "gstin": "gstin",
+        "gst_category": "gstType",
+        "customer_primary_address": "address",
+    }
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["customer_name"] = self._dirty_doc.get("name")
-        address_name = frappe.db.get_value(
-            "Books Reference",
-            {
-                "document_type": "Address",
-                "books_name": self.converted_doc["customer_primary_address"],
-                "books_instance": self.instance
-            },
-            "document_name"
-        )
+        address_name = self.get_erp_reference_name(self.converted_doc["customer_primary_address"], "Address")
         self.converted_doc["customer_primary_address"]= address_name
 
     def _fill_missing_values_for_fbooks(self):
@@ -346,27 +358,17 @@ class Customer(DocConverterBase):
 
 
 class Supplier(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "gstin": "gstin",
-            "gst_category": "gstType",
-            "supplier_primary_address": "address",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "gstin": "gstin",
+        "gst_category": "gstType",
+        "supplier_primary_address": "address",
+    }
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["supplier_name"] = self._dirty_doc.get("name")
 
-        address_name = frappe.db.get_value(
-            "Books Reference",
-            {
-                "document_type": "Address",
-                "books_name": self.converted_doc["supplier_primary_address"],
-                "books_instance": self.instance
-            },
-            "document_name"
-        )
+        address_name = self.get_erp_reference_name(self.converted_doc["supplier_primary_address"], "Address")
         self.converted_doc["supplier_primary_address"]= address_name
 
     def _fill_missing_values_for_fbooks(self):
@@ -374,46 +376,46 @@ class Supplier(DocConverterBase):
 
 
 class SalesInvoice(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "customer": "party",
-            "posting_date": "date",
-            "is_return": "isReturn",
-            "return_against": "returnAgainst",
-            "selling_price_list": "priceList",
-            "net_total": "netTotal",
-            "base_grand_total": "baseGrandTotal",
-            "grand_total": "grandTotal",
-            "currency": "currency",
-            "conversion_rate": "exchangeRate",
-            "outstanding_amount": "outstandingAmount",
-            "terms": "terms",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "items",
-                    "fbooks_fieldname": "items",
-                    "fbooks_doctype": "SalesInvoiceItem",
-                    "erpn_doctype": "Sales Invoice Item",
-                    "fieldmap": {
-                        # KEEPING THIS AS IS, AS YOU STATED IT WORKS FOR SALES INVOICE
-                        # This means FBooks 'item' populates both ERPNext 'item_code' and 'item_name'
-                        "item_code": "item",
-                        "item_name": "item",
-                        "description": "description",
-                        "qty": "quantity",
-                        "stock_uom": "unit",
-                        "batch_no": "batch",
-                        "conversion_factor": "unitConversionFactor",
-                        "discount_percentage": "itemDiscountPercent",
-                        "discount_amount": "itemDiscountAmount",
-                        "price_list_rate": "rate",
-                        "amount": "amount",
-                        "income_account": "account", 
-                    },
+    field_map = {
+        "customer": "party",
+        "posting_date": "date",
+        "is_return": "isReturn",
+        "return_against": "returnAgainst",
+        "selling_price_list": "priceList",
+        "net_total": "netTotal",
+        "base_grand_total": "baseGrandTotal",
+        "grand_total": "grandTotal",
+        "currency": "currency",
+        "conversion_rate": "exchangeRate",
+        "outstanding_amount": "outstandingAmount",
+        "terms": "terms",
+        "child_tables": [
+            {
+                "erpn_fieldname": "items",
+                "fbooks_fieldname": "items",
+                "fbooks_doctype": "SalesInvoiceItem",
+                "erpn_doctype": "Sales Invoice Item",
+                "fieldmap": {
+                    # KEEPING THIS AS IS, AS YOU STATED IT WORKS FOR SALES INVOICE
+                    # This means FBooks 'item' populates both ERPNext 'item_code' and 'item_name'
+                    "item_code": "item",
+                    "item_name": "item",
+                    "description": "description",
+                    "qty": "quantity",
+                    "stock_uom": "unit",
+                    "batch_no": "batch",
+                    "conversion_factor": "unitConversionFactor",
+                    "discount_percentage": "itemDiscountPercent",
+                    "discount_amount": "itemDiscountAmount",
+                    "price_list_rate": "rate",
+                    "amount": "amount",
+                    "income_account": "account", 
                 },
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+            },
+        ],
+    }
+    required_fields = ("name", "party", "date", "items")
+    required_child_fields = {"items": ("item", "quantity")}
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["disable_rounded_total"] = 1
@@ -434,11 +436,7 @@ class SalesInvoice(DocConverterBase):
         self.converted_doc["pos_profile"] = pos_profile
         self.converted_doc["company"] = pos_details.get("company")
         
-        customer_name_in_erpn = frappe.db.get_value(
-            "Books Reference",
-            {"document_type": "Customer", "books_name": self.converted_doc["customer"], "books_instance": self.instance},
-            "document_name"
-        )
+        customer_name_in_erpn = self.get_erp_reference_name(self.converted_doc["customer"], "Customer")
         if customer_name_in_erpn:
             self.converted_doc["customer"] = customer_name_in_erpn
         elif not frappe.db.exists("Customer", self.converted_doc["customer"]):
@@ -479,11 +477,7 @@ class SalesInvoice(DocConverterBase):
             self.converted_doc["is_return"] = 1
             self.converted_doc["update_outstanding_for_self"] = 1
             self.converted_doc["update_billed_amount_in_delivery_note"] = 1
-            erpn_invoice = frappe.db.get_value(
-                "Books Reference",
-                {"books_name": self.converted_doc["return_against"], "books_instance": self.instance},
-                "document_name"
-            )
+            erpn_invoice = self.get_erp_reference_name(self.converted_doc["return_against"])
             self.converted_doc["return_against"] = erpn_invoice
 
         self.converted_doc['books_instance'] = self.instance
@@ -499,29 +493,29 @@ class SalesInvoice(DocConverterBase):
 
 
 class PaymentEntry(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "posting_date": "date",
-            "payment_type": "paymentType",
-            "mode_of_payment": "paymentMethod",
-            "total_allocated_amount": "amount",
-            "reference_no": "referenceId",
-            "reference_date": "clearanceDate",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "references",
-                    "fbooks_fieldname": "for",
-                    "fbooks_doctype": "PaymentFor",
-                    "erpn_doctype": "Payment Entry Reference",
-                    "fieldmap": {
-                        "reference_name": "referenceName",
-                        "reference_doctype": "referenceType",
-                        "total_amount": "amount",
-                    },
+    field_map = {
+        "posting_date": "date",
+        "payment_type": "paymentType",
+        "mode_of_payment": "paymentMethod",
+        "total_allocated_amount": "amount",
+        "reference_no": "referenceId",
+        "reference_date": "clearanceDate",
+        "child_tables": [
+            {
+                "erpn_fieldname": "references",
+                "fbooks_fieldname": "for",
+                "fbooks_doctype": "PaymentFor",
+                "erpn_doctype": "Payment Entry Reference",
+                "fieldmap": {
+                    "reference_name": "referenceName",
+                    "reference_doctype": "referenceType",
+                    "total_amount": "amount",
                 },
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+            },
+        ],
+    }
+    required_fields = ("name", "party", "date", "paymentMethod", "amount")
+    required_child_fields = {"for": ("referenceType", "referenceName")}
 
     def _fill_missing_values_for_erpn(self):
         pos_profile = frappe.db.get_value(
@@ -537,11 +531,7 @@ class PaymentEntry(DocConverterBase):
         
         # FIX: Resolve Party (Customer/Supplier) from Books Reference or directly
         fbooks_party_name = self.doc_dict.get("party")
-        party_name_in_erpn = frappe.db.get_value(
-            "Books Reference",
-            {"document_type": "Customer", "books_name": fbooks_party_name, "books_instance": self.instance},
-            "document_name"
-        )
+        party_name_in_erpn = self.get_erp_reference_name(fbooks_party_name, "Customer")
         if not party_name_in_erpn: 
             if frappe.db.exists("Customer", fbooks_party_name):
                 party_name_in_erpn = fbooks_party_name
@@ -599,19 +589,14 @@ class PaymentEntry(DocConverterBase):
         )
 
         for row in self.converted_doc["references"]:
-            reference_name_in_erpn = frappe.db.get_value(
-                "Books Reference",
-                {"books_name": row["reference_name"], "books_instance": self.instance},
-                "document_name",
-            )
+            reference_in_erpn = get_books_reference(self.instance, row["reference_name"])
             # FIX: Throw if reference document not found in ERPNext
-            if not reference_name_in_erpn:
+            if not reference_in_erpn:
                 frappe.throw(_(f"Reference document '{row['reference_name']}' not found in ERPNext for Payment Entry '{self.doc_dict.get('name')}'. Please ensure it's synced and submitted."))
 
-            row["reference_name"] = reference_name_in_erpn
-            row["reference_doctype"] = get_doctype_name(
-                row["reference_doctype"], self.target
-            )
+            row["reference_name"] = reference_in_erpn.document_name
+            # invoices synced before the invoice mode changed keep their doctype
+            row["reference_doctype"] = reference_in_erpn.document_type
 
             row["total_amount"] = float(row["total_amount"])
             row["allocated_amount"] = float(row["total_amount"])
@@ -630,35 +615,35 @@ class PaymentEntry(DocConverterBase):
 
 
 class StockEntry(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "stock_entry_type": "movementType",
-            "posting_date": "date",
-            "total_amount": "amount",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "items",
-                    "fbooks_fieldname": "items",
-                    "fbooks_doctype": "StockMovementItem",
-                    "erpn_doctype": "Stock Entry Detail",
-                    "fieldmap": {
-                        "item_name": "item", # Map FBooks item (name) to ERPNext item_name. item_code will be resolved.
-                        "s_warehouse": "fromLocation",
-                        "t_warehouse": "toLocation",
-                        "qty": "quantity",
-                        "transfer_qty": "transferQuantity",
-                        "uom": "transferUnit",
-                        "stock_uom": "unit",
-                        "conversion_factor": "unitConversionFactor",
-                        "basic_rate": "rate",
-                        "amount": "amount",
-                        "serial_no": "serialNumber",
-                    },
-                }
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "stock_entry_type": "movementType",
+        "posting_date": "date",
+        "total_amount": "amount",
+        "child_tables": [
+            {
+                "erpn_fieldname": "items",
+                "fbooks_fieldname": "items",
+                "fbooks_doctype": "StockMovementItem",
+                "erpn_doctype": "Stock Entry Detail",
+                "fieldmap": {
+                    "item_name": "item", # Map FBooks item (name) to ERPNext item_name. item_code will be resolved.
+                    "s_warehouse": "fromLocation",
+                    "t_warehouse": "toLocation",
+                    "qty": "quantity",
+                    "transfer_qty": "transferQuantity",
+                    "uom": "transferUnit",
+                    "stock_uom": "unit",
+                    "conversion_factor": "unitConversionFactor",
+                    "basic_rate": "rate",
+                    "amount": "amount",
+                    "serial_no": "serialNumber",
+                },
+            }
+        ],
+    }
+    required_fields = ("name", "movementType", "date", "items")
+    required_child_fields = {"items": ("item", "quantity")}
 
     def _fill_missing_values_for_erpn(self):
         if "Material" in self.converted_doc["stock_entry_type"]:
@@ -724,42 +709,38 @@ class StockEntry(DocConverterBase):
 
 
 class PriceList(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "enabled": "isEnabled",
-            "price_list_name": "name",
-            "buying": "isPurchase",
-            "selling": "isSelling",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "item_prices", 
-                    "fbooks_fieldname": "priceListItem",
-                    "fbooks_doctype": "PriceListItem",
-                    "erpn_doctype": "Item Price",
-                    "fieldmap": {
-                        "name": "name",
-                        "item_code": "item",
-                        "uom": "unit",
-                        "price_list": "parent",
-                        "price_list_rate": "rate",
-                    },
-                }
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "enabled": "isEnabled",
+        "price_list_name": "name",
+        "buying": "isPurchase",
+        "selling": "isSelling",
+        "child_tables": [
+            {
+                "erpn_fieldname": "item_prices", 
+                "fbooks_fieldname": "priceListItem",
+                "fbooks_doctype": "PriceListItem",
+                "erpn_doctype": "Item Price",
+                "fieldmap": {
+                    "name": "name",
+                    "item_code": "item",
+                    "uom": "unit",
+                    "price_list": "parent",
+                    "price_list_rate": "rate",
+                },
+            }
+        ],
+    }
 
 
 class ItemPrice(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "item_code": "item",
-            "uom": "unit",
-            "price_list": "parent",
-            "price_list_rate": "rate",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "item_code": "item",
+        "uom": "unit",
+        "price_list": "parent",
+        "price_list_rate": "rate",
+    }
 
     def _fill_missing_values_for_fbooks(self):
         self.converted_doc["parentSchemaName"] = get_doctype_name(
@@ -769,72 +750,69 @@ class ItemPrice(DocConverterBase):
 
 
 class SerialNumber(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "serial_no": "name",
-            "item_code": "item",
-            "description": "description",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "serial_no": "name",
+        "item_code": "item",
+        "description": "description",
+    }
 
 
 class Batch(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "batch_id": "name",
-            "item": "item",
-            "expiry_date": "expiryDate",
-            "manufacturing_date": "manufactureDate",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "batch_id": "name",
+        "item": "item",
+        "expiry_date": "expiryDate",
+        "manufacturing_date": "manufactureDate",
+    }
 
     def _fill_missing_values_for_fbooks(self):
+        item_names = self.lookups.get("item_names") or {}
+        if self.converted_doc["item"] in item_names:
+            self.converted_doc["item"] = item_names[self.converted_doc["item"]]
+            return
+
         self.converted_doc["item"] = frappe.db.get_value(
             "Item", self.converted_doc["item"], "item_name"
         )
 
 
 class UOM(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "must_be_whole_number": "isWhole",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "must_be_whole_number": "isWhole",
+    }
 
 
 class UOMConversionDetail(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {"uom": "uom", "conversion_factor": "conversionFactor"}
-        super().__init__(instance, dirty_doc, target)
+    field_map = {"uom": "uom", "conversion_factor": "conversionFactor"}
 
 
 class DeliveryNote(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "customer": "party",
-            "posting_date": "date",
-            "grand_total": "grandTotal",
-            "backReference": "against_sales_invoice", 
-            "child_tables": [
-                {
-                    "erpn_fieldname": "items",
-                    "fbooks_fieldname": "items",
-                    "fbooks_doctype": "ShipmentItem",
-                    "erpn_doctype": "Delivery Note Item",
-                    "fieldmap": {
-                        # FIX: Map FBooks 'item' (name) directly to ERPNext 'item_name'.
-                        # 'item_code' will be resolved from 'item_name' in _fill_missing_values_for_erpn.
-                        "item_name": "item", 
-                        "qty": "quantity",
-                        "uom": "unit",
-                        "rate": "rate",
-                        "warehouse": "location",
-                    },
-                }
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "customer": "party",
+        "posting_date": "date",
+        "grand_total": "grandTotal",
+        "backReference": "against_sales_invoice", 
+        "child_tables": [
+            {
+                "erpn_fieldname": "items",
+                "fbooks_fieldname": "items",
+                "fbooks_doctype": "ShipmentItem",
+                "erpn_doctype": "Delivery Note Item",
+                "fieldmap": {
+                    # FIX: Map FBooks 'item' (name) directly to ERPNext 'item_name'.
+                    # 'item_code' will be resolved from 'item_name' in _fill_missing_values_for_erpn.
+                    "item_name": "item", 
+                    "qty": "quantity",
+                    "uom": "unit",
+                    "rate": "rate",
+                    "warehouse": "location",
+                },
+            }
+        ],
+    }
+    required_fields = ("name", "party", "date", "items")
+    required_child_fields = {"items": ("item", "quantity")}
 
     def _fill_missing_values_for_erpn(self):
         pos_profile = frappe.db.get_value(
@@ -854,11 +832,7 @@ class DeliveryNote(DocConverterBase):
         self.converted_doc['from_frappebooks'] = 1
 
         # FIX: Resolve customer from Books Reference or directly exist in ERPNext
-        customer_name_in_erpn = frappe.db.get_value(
-            "Books Reference",
-            {"document_type": "Customer", "books_name": self.converted_doc["customer"], "books_instance": self.instance},
-            "document_name"
-        )
+        customer_name_in_erpn = self.get_erp_reference_name(self.converted_doc["customer"], "Customer")
         if customer_name_in_erpn:
             self.converted_doc["customer"] = customer_name_in_erpn
         elif not frappe.db.exists("Customer", self.converted_doc["customer"]):
@@ -890,11 +864,7 @@ class DeliveryNote(DocConverterBase):
             # FIX: Handle Against Sales Invoice Item linking
             if self.doc_dict.get("backReference"):
                 try:
-                    reference_name_in_erpn = frappe.db.get_value(
-                        "Books Reference",
-                        {"books_name": self.doc_dict.get("backReference"), "books_instance": self.instance},
-                        "document_name",
-                    )
+                    reference_name_in_erpn = self.get_erp_reference_name(self.doc_dict.get("backReference"))
 
                     if reference_name_in_erpn:
                         row["against_sales_invoice"] = reference_name_in_erpn
@@ -944,9 +914,7 @@ class DeliveryNote(DocConverterBase):
             self.doc_can_save = True
             return True
 
-        ref_doc_name_in_erpn = frappe.db.get_value(
-            "Books Reference", {"books_name": ref_doc_name, "books_instance": self.instance}, "document_name"
-        )
+        ref_doc_name_in_erpn = self.get_erp_reference_name(ref_doc_name)
 
         if not ref_doc_name_in_erpn:
             self.doc_can_save = False
@@ -967,40 +935,38 @@ class DeliveryNote(DocConverterBase):
 
 
 class Address(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "address_line1": "addressLine1",
-            "address_line2": "addressLine2",
-            "city": "city",
-            "state": "state",
-            "country": "country",
-            "pincode": "postalCode",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "address_line1": "addressLine1",
+        "address_line2": "addressLine2",
+        "city": "city",
+        "state": "state",
+        "country": "country",
+        "pincode": "postalCode",
+    }
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["address_title"] = self.converted_doc.get("name")
 
 
 class POSOpeningShift(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "period_start_date": "openingDate",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "balance_details",
-                    "fbooks_fieldname": "openingAmounts",
-                    "fbooks_doctype": "openingAmounts",
-                    "erpn_doctype": "POS Opening Entry Detail",
-                    "fieldmap": {
-                        "mode_of_payment": "paymentMethod",
-                        "opening_amount": "amount",
-                    },
+    field_map = {
+        "period_start_date": "openingDate",
+        "child_tables": [
+            {
+                "erpn_fieldname": "balance_details",
+                "fbooks_fieldname": "openingAmounts",
+                "fbooks_doctype": "openingAmounts",
+                "erpn_doctype": "POS Opening Entry Detail",
+                "fieldmap": {
+                    "mode_of_payment": "paymentMethod",
+                    "opening_amount": "amount",
                 },
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+            },
+        ],
+    }
+    required_fields = ("name", "openingDate")
+    required_child_fields = {"openingAmounts": ("paymentMethod",)}
 
     def _fill_missing_values_for_erpn(self):
         pos_profile = frappe.db.get_value(
@@ -1038,27 +1004,27 @@ class POSOpeningShift(DocConverterBase):
 
 
 class POSClosingShift(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "period_end_date": "closingDate",
-            "pos_opening_entry": "openingShift",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "payment_reconciliation",
-                    "fbooks_fieldname": "closingAmounts",
-                    "fbooks_doctype": "closingAmounts",
-                    "erpn_doctype": "POS Closing Entry Detail",
-                    "fieldmap": {
-                        "mode_of_payment": "paymentMethod",
-                        "opening_amount": "openingAmount",
-                        "closing_amount": "closingAmount",
-                        "expected_amount": "expectedAmount",
-                        "difference": "differenceAmount",
-                    },
+    field_map = {
+        "period_end_date": "closingDate",
+        "pos_opening_entry": "openingShift",
+        "child_tables": [
+            {
+                "erpn_fieldname": "payment_reconciliation",
+                "fbooks_fieldname": "closingAmounts",
+                "fbooks_doctype": "closingAmounts",
+                "erpn_doctype": "POS Closing Entry Detail",
+                "fieldmap": {
+                    "mode_of_payment": "paymentMethod",
+                    "opening_amount": "openingAmount",
+                    "closing_amount": "closingAmount",
+                    "expected_amount": "expectedAmount",
+                    "difference": "differenceAmount",
                 },
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+            },
+        ],
+    }
+    required_fields = ("name", "closingDate", "openingShift")
+    required_child_fields = {"closingAmounts": ("paymentMethod",)}
 
     def _fill_missing_values_for_erpn(self):
         pos_profile = frappe.db.get_value(
@@ -1086,11 +1052,7 @@ class POSClosingShift(DocConverterBase):
         self.converted_doc['books_instance'] = self.instance
         self.converted_doc['from_frappebooks'] = 1
         
-        opening_entry = frappe.db.get_value(
-            "Books Reference",
-            {"books_name": self.converted_doc["pos_opening_entry"], "books_instance": self.instance},
-            "document_name"
-        )
+        opening_entry = self.get_erp_reference_name(self.converted_doc["pos_opening_entry"])
         if not opening_entry:
              frappe.throw(_(f"POS Opening Entry reference not found for FrappeBooks name: {self.converted_doc['pos_opening_entry']}"))
         self.converted_doc["pos_opening_entry"] = opening_entry
@@ -1099,51 +1061,112 @@ class POSClosingShift(DocConverterBase):
         for item in self.converted_doc['payment_reconciliation']:
             item["mode_of_payment"] = self.get_erp_payment_method(item.get("mode_of_payment"))
 
+        # shifts opened before totals were kept use the amounts sent by Books
+        if collected := get_shift_totals(opening_entry):
+            self._set_expected_amounts(collected)
+
         self.converted_doc['payment_reconciliation'] = [
             item for item in self.converted_doc['payment_reconciliation']
             if any(flt(item.get(key, 0)) != 0 for key in ["opening_amount", "closing_amount", "expected_amount", "difference"])
         ]
 
+        if get_invoice_doctype() == "POS Invoice":
+            self._set_pos_transactions(pos_profile)
+
+    def _set_expected_amounts(self, collected):
+        """Sets the expected amount of each mode of payment from the totals
+        kept while the shift's payments were applied."""
+        collected = dict(collected)
+        for item in self.converted_doc['payment_reconciliation']:
+            item["expected_amount"] = flt(item.get("opening_amount")) + flt(
+                collected.pop(item.get("mode_of_payment"), 0)
+            )
+            item["difference"] = flt(item.get("closing_amount")) - item["expected_amount"]
+
+        for mode_of_payment, amount in collected.items():
+            self.converted_doc['payment_reconciliation'].append({
+                "mode_of_payment": mode_of_payment,
+                "opening_amount": 0,
+                "closing_amount": 0,
+                "expected_amount": flt(amount),
+                "difference": -flt(amount),
+            })
+
+    def _set_pos_transactions(self, pos_profile):
+        """Lists the shift's POS Invoices so that submitting the closing
+        entry consolidates them into Sales Invoices."""
+        pos_invoice = frappe.qb.DocType("POS Invoice")
+        invoices = (
+            frappe.qb.from_(pos_invoice)
+            .select(
+                pos_invoice.name.as_("pos_invoice"),
+                pos_invoice.posting_date,
+                pos_invoice.customer,
+                pos_invoice.grand_total,
+                pos_invoice.net_total,
+                pos_invoice.total_qty,
+            )
+            .where(pos_invoice.books_instance == self.instance)
+            .where(pos_invoice.pos_profile == pos_profile)
+            .where(pos_invoice.docstatus == 1)
+            .where(IfNull(pos_invoice.consolidated_invoice, "") == "")
+            .where(pos_invoice.posting_date <= getdate(self.converted_doc["period_end_date"]))
+            .orderby(pos_invoice.posting_date)
+            .orderby(pos_invoice.name)
+            .run(as_dict=True)
+        )
+
+        self.converted_doc["pos_transactions"] = [
+            {
+                "pos_invoice": row.pos_invoice,
+                "posting_date": row.posting_date,
+                "customer": row.customer,
+                "grand_total": row.grand_total,
+            }
+            for row in invoices
+        ]
+        self.converted_doc["grand_total"] = sum(flt(row.grand_total) for row in invoices)
+        self.converted_doc["net_total"] = sum(flt(row.net_total) for row in invoices)
+        self.converted_doc["total_quantity"] = sum(flt(row.total_qty) for row in invoices)
+
 
 class PricingRule(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "title": "title",
-            "price_or_product_discount": "discountType",
-            "coupon_code_based": "isCouponCodeBased",
-            "apply_multiple_pricing_rules": "isMultiple",
-            "priority": "priority",
-            "rate_or_discount": "priceDiscountType",
-            "rate": "discountRate",
-            "discount_percentage": "discountPercentage",
-            "discount_amount": "discountAmount",
-            "free_item": "freeItem",
-            "free_qty": "freeItemQuantity",
-            "free_item_uom": "freeItemUnit",
-            "round_free_qty": "roundFreeItemQty",
-            "is_recursive": "isRecursive",
-            "recurse_for": "recurseEvery",
-            "valid_from": "validFrom",
-            "valid_upto": "validTo",
-            "free_item_rate": "freeItemRate",
-            "min_qty": "minQuantity",
-            "max_qty": "maxQuantity",
-            "min_amt": "minAmount",
-            "max_amt": "maxAmount",
-            "child_tables": [
-                {
-                    "erpn_fieldname": "items",
-                    "fbooks_fieldname": "appliedItems",
-                    "fbooks_doctype": "PricingRuleItem",
-                    "erpn_doctype": "Pricing Rule Item Code",
-                    "fieldmap": {
-                        "item_code": "item", 
-                        "uom": "unit",
-                    },
+    field_map = {
+        "title": "title",
+        "price_or_product_discount": "discountType",
+        "coupon_code_based": "isCouponCodeBased",
+        "apply_multiple_pricing_rules": "isMultiple",
+        "priority": "priority",
+        "rate_or_discount": "priceDiscountType",
+        "rate": "discountRate",
+        "discount_percentage": "discountPercentage",
+        "discount_amount": "discountAmount",
+        "free_item": "freeItem",
+        "free_qty": "freeItemQuantity",
+        "free_item_uom": "freeItemUnit",
+        "round_free_qty": "roundFreeItemQty",
+        "is_recursive": "isRecursive",
+        "recurse_for": "recurseEvery",
+        "valid_from": "validFrom",
+        "valid_upto": "validTo",
+        "free_item_rate": "freeItemRate",
+        "min_qty": "minQuantity",
+        "max_qty": "maxQuantity",
+        "min_amt": "minAmount",
+        "max_amt": "maxAmount",
+        "child_tables": [
+            {
+                "erpn_fieldname": "items",
+                "fbooks_fieldname": "appliedItems",
+                "fbooks_doctype": "PricingRuleItem",
+                "erpn_doctype": "Pricing Rule Item Code",
+                "fieldmap": {
+                    "item_code": "item", 
+                    "uom": "unit",
                 },
-            ],
-        }
-        super().__init__(instance, dirty_doc, target)
+            },
+        ],
+    }
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["apply_on"] = "Item Code"
@@ -1213,12 +1236,10 @@ class PricingRule(DocConverterBase):
         self.converted_doc["erpnextDocName"] = self.doc_dict.get("name")
 
 class ItemGroup(DocConverterBase):
-    def __init__(self, instance, dirty_doc, target):
-        self.field_map = {
-            "name": "name",
-            "gst_hsn_code": "hsnCode",
-        }
-        super().__init__(instance, dirty_doc, target)
+    field_map = {
+        "name": "name",
+        "gst_hsn_code": "hsnCode",
+    }
 
     def _fill_missing_values_for_fbooks(self):
         if self.doc_dict.get("taxes") and self.doc_dict["taxes"] and self.doc_dict["taxes"][0]:
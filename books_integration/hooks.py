@@ -85,6 +85,9 @@ app_license = "mit"
 # before_install = "books_integration.install.before_install"
 # after_install = "books_integration.install.after_install"
 
+after_migrate = "books_integration.schema.clear_record_schema_cache"
+clear_cache = "books_integration.schema.clear_record_schema_cache"
+
 # Uninstallation
 # ------------
 
@@ -148,6 +151,21 @@ doc_events = {
     "Batch": {"on_update": "books_integration.sync_queue.add_doc_to_sync_queue"},
     "Item Group": {"on_update": "books_integration.sync_queue.add_doc_to_sync_queue"},
     "Pricing Rule": {"on_update": "books_integration.sync_queue.add_doc_to_sync_queue"},
+    "Payment Entry": {
+        "before_insert": "books_integration.shift_totals.set_pos_shift",
+        "on_submit": "books_integration.shift_totals.update_shift_totals",
+        "on_cancel": "books_integration.shift_totals.update_shift_totals",
+    },
+    "POS Invoice": {
+        "before_insert": "books_integration.shift_totals.set_pos_shift",
+        "on_submit": "books_integration.shift_totals.update_shift_totals",
+        "on_cancel": "books_integration.shift_totals.update_shift_totals",
+    },
+    "Sales Invoice": {
+        "before_insert": "books_integration.shift_totals.set_pos_shift",
+        "on_submit": "books_integration.shift_totals.update_shift_totals",
+        "on_cancel": "books_integration.shift_totals.update_shift_totals",
+    },
 }
 
 # Scheduled Tasks
@@ -155,8 +173,19 @@ doc_events = {
 
 scheduler_events = {
 	"hourly": [
-		"books_integration.scheduler.enqueue_process_transactions"
+		"books_integration.scheduler.enqueue_process_transactions",
+		"books_integration.resync.resume_resync_jobs"
+	],
+	"daily": [
+		"books_integration.scheduler.archive_integration_logs",
+		"books_integration.snapshot.queue_snapshot_build"
 	],
+	"cron": {
+		"*/10 * * * *": [
+			"books_integration.scheduler.retry.retry_failed_records",
+			"books_integration.scheduler.submission.enqueue_deferred_submission"
+		],
+	},
 }
 
 # Testing
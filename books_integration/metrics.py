@@ -0,0 +1,48 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import flt
+from redis import Redis
+
+METRICS_CACHE_KEY = "books_integration_metrics"
+
+
+def _get_key():
+    return frappe.cache.make_key(METRICS_CACHE_KEY)
+
+
+def incr(metric, count=1):
+    frappe.cache.hincrby(_get_key(), metric, count)
+
+
+def observe(metric, seconds, count=1):
+    """Records `count` events of `metric` that took `seconds` in total."""
+    frappe.cache.hincrby(_get_key(), f"{metric}.count", count)
+    frappe.cache.hincrbyfloat(_get_key(), f"{metric}.seconds", seconds)
+
+
+def get_metrics():
+    # counters are raw numbers, which frappe.cache.hgetall would unpickle
+    # under a key it prefixes again
+    metrics = {
+        frappe.safe_decode(key): flt(frappe.safe_decode(value))
+        for key, value in (Redis.hgetall(frappe.cache, _get_key()) or {}).items()
+    }
+
+    updates = metrics.get("inbound.updated", 0) + metrics.get("inbound.unchanged", 0)
+    metrics["inbound.unchanged_rate"] = flt(
+        metrics.get("inbound.unchanged", 0) / updates if updates else 0, 4
+    )
+
+    lookups = metrics.get("reference_cache.lookups", 0)
+    misses = metrics.get("reference_cache.misses", 0)
+    metrics["reference_cache.hit_rate"] = flt(
+        (lookups - misses) / lookups if lookups else 0, 4
+    )
+
+    return metrics
+
+
+def reset_metrics():
+    frappe.cache.delete(_get_key())
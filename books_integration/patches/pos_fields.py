@@ -57,6 +57,59 @@ def execute():
                     "insert_after": "from_frappebooks",
                     "read_only": 1,
                 },
+                {
+                    "fieldname": "books_pending_submit",
+                    "label": "Pending Books Submission",
+                    "fieldtype": "Check",
+                    "insert_after": "books_instance",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                },
+                {
+                    "fieldname": "books_pos_opening_entry",
+                    "label": "Books POS Shift",
+                    "fieldtype": "Link",
+                    "options": "POS Opening Entry",
+                    "insert_after": "books_pending_submit",
+                    "read_only": 1,
+                    "no_copy": 1,
+                },
+            ],
+            "POS Invoice": [
+                {
+                    "fieldname": "from_frappebooks",
+                    "label": "From FrappeBooks",
+                    "fieldtype": "Check",
+                    "insert_after": "customer",
+                    "read_only": 0,
+                },
+                {
+                    "fieldname": "books_instance",
+                    "label": "Books Instance",
+                    "fieldtype": "Link",
+                    "options": "Books Instance",
+                    "insert_after": "from_frappebooks",
+                    "read_only": 1,
+                },
+                {
+                    "fieldname": "books_pending_submit",
+                    "label": "Pending Books Submission",
+                    "fieldtype": "Check",
+                    "insert_after": "books_instance",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                },
+                {
+                    "fieldname": "books_pos_opening_entry",
+                    "label": "Books POS Shift",
+                    "fieldtype": "Link",
+                    "options": "POS Opening Entry",
+                    "insert_after": "books_pending_submit",
+                    "read_only": 1,
+                    "no_copy": 1,
+                },
             ],
             "Payment Entry": [
                 {
@@ -74,6 +127,24 @@ def execute():
                     "insert_after": "from_frappebooks",
                     "read_only": 1,
                 },
+                {
+                    "fieldname": "books_pending_submit",
+                    "label": "Pending Books Submission",
+                    "fieldtype": "Check",
+                    "insert_after": "books_instance",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                },
+                {
+                    "fieldname": "books_pos_opening_entry",
+                    "label": "Books POS Shift",
+                    "fieldtype": "Link",
+                    "options": "POS Opening Entry",
+                    "insert_after": "books_pending_submit",
+                    "read_only": 1,
+                    "no_copy": 1,
+                },
             ]
         }
     )
\ No newline at end of file
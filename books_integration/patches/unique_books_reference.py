@@ -0,0 +1,31 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.query_builder.functions import Count
+from books_integration.books_integration.doctype.books_reference.books_reference import (
+    on_doctype_update,
+)
+
+
+def execute():
+    # keeps the latest reference of each document so the unique key can be added
+    reference = frappe.qb.DocType("Books Reference")
+    duplicates = (
+        frappe.qb.from_(reference)
+        .select(reference.document_type, reference.document_name, reference.books_instance)
+        .groupby(reference.document_type, reference.document_name, reference.books_instance)
+        .having(Count(reference.name) > 1)
+        .run(as_dict=True)
+    )
+
+    for row in duplicates:
+        names = frappe.get_all(
+            "Books Reference",
+            filters=row,
+            order_by="modified desc",
+            pluck="name",
+        )
+        frappe.db.delete("Books Reference", {"name": ("in", names[1:])})
+
+    on_doctype_update()
@@ -0,0 +1,127 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import hashlib
+
+import frappe
+from frappe.query_builder.functions import Count, Max
+from frappe.utils import get_datetime
+from books_integration.metrics import incr
+from books_integration.sync_queue import OUTBOUND_DOCTYPES, get_sync_instances, queue_documents
+
+# Each outbound doctype has a hash tree that the Books client rebuilds from
+# the `erpnextDocName` and `erpnextModified` of the records it holds:
+# - a leaf is sha1 of "<name>\0<modified>"
+# - a document goes to the bucket named by the first hex characters of the
+#   sha1 of its name
+# - a bucket's digest is sha1 of its leaves, concatenated in name order
+# - every other node's digest is sha1 of its 16 children, concatenated in
+#   hex order, so the root covers 16 ** BUCKET_PREFIX_LENGTH buckets
+BUCKET_PREFIX_LENGTH = 2
+HEX_DIGITS = "0123456789abcdef"
+DIGEST_CACHE_TTL = 10 * 60
+
+
+def add_reconciliation_keys(record, doc):
+    """Adds the fields an outbound record is hashed on by the Books client."""
+    record.setdefault("erpnextDocName", doc.get("name"))
+    record["erpnextModified"] = get_leaf_version(doc.get("modified"))
+    return record
+
+
+def get_reconciled_doctypes(instance):
+    """Returns the outbound doctypes that are synced to the instance."""
+    return [doctype for doctype in OUTBOUND_DOCTYPES if instance in get_sync_instances(doctype)]
+
+
+def get_leaf_version(modified):
+    return str(get_datetime(modified))
+
+
+def get_bucket(name):
+    return _sha1(name)[:BUCKET_PREFIX_LENGTH]
+
+
+def get_leaf_digest(name, version):
+    return _sha1(f"{name}\0{version}")
+
+
+def get_child_digests(doctype, prefix=""):
+    """Returns the digests of the children of a node, by their prefix."""
+    tree = get_digest_tree(doctype)
+    return {child: tree[child] for child in (prefix + digit for digit in HEX_DIGITS)}
+
+
+def get_digest_tree(doctype):
+    """Returns the digest of every node of the doctype's tree, by prefix.
+    Cached until a document of the doctype is added, changed or deleted."""
+    document = frappe.qb.DocType(doctype)
+    count, last_modified = (
+        frappe.qb.from_(document).select(Count(document.name), Max(document.modified)).run()
+    )[0]
+
+    key = f"books_reconciliation|{doctype}|{count}|{last_modified}"
+    tree = frappe.cache.get_value(key)
+    if tree is None:
+        tree = build_digest_tree(get_bucket_leaves(doctype))
+        frappe.cache.set_value(key, tree, expires_in_sec=DIGEST_CACHE_TTL)
+
+    return tree
+
+
+def build_digest_tree(bucket_leaves):
+    tree = {}
+    for depth in range(BUCKET_PREFIX_LENGTH, -1, -1):
+        for prefix in _iter_prefixes(depth):
+            if depth == BUCKET_PREFIX_LENGTH:
+                leaves = bucket_leaves.get(prefix) or {}
+                children = (get_leaf_digest(name, leaves[name]) for name in sorted(leaves))
+            else:
+                children = (tree[prefix + digit] for digit in HEX_DIGITS)
+
+            tree[prefix] = _sha1("".join(children))
+
+    return tree
+
+
+def get_bucket_leaves(doctype, buckets=None):
+    """Returns the version of every document of the doctype, by bucket."""
+    bucket_leaves = {}
+    for name, modified in frappe.get_all(doctype, fields=["name", "modified"], as_list=True):
+        bucket = get_bucket(name)
+        if buckets is None or bucket in buckets:
+            bucket_leaves.setdefault(bucket, {})[name] = get_leaf_version(modified)
+
+    return bucket_leaves
+
+
+def reconcile_buckets(instance, doctype, buckets):
+    """Compares the leaves the Books client holds in mismatched buckets with
+    ERPNext's, queues the documents that are missing or stale on the client
+    and returns the names it holds that no longer exist in ERPNext."""
+    if doctype not in get_reconciled_doctypes(instance):
+        frappe.throw(frappe._("{0} is not synced to {1}").format(doctype, instance))
+
+    bucket_leaves = get_bucket_leaves(doctype, set(buckets))
+    stale, deleted = [], []
+    for bucket, client_leaves in buckets.items():
+        leaves = bucket_leaves.get(bucket) or {}
+        client_leaves = client_leaves or {}
+        stale.extend(name for name, version in leaves.items() if client_leaves.get(name) != version)
+        deleted.extend(name for name in client_leaves if name not in leaves)
+
+    queue_documents(instance, doctype, stale)
+    incr("reconciliation.requeued", len(stale))
+    return {"requeued": len(stale), "deleted": deleted}
+
+
+def _iter_prefixes(depth):
+    prefixes = [""]
+    for _ in range(depth):
+        prefixes = [prefix + digit for prefix in prefixes for digit in HEX_DIGITS]
+
+    return prefixes
+
+
+def _sha1(value):
+    return hashlib.sha1(value.encode()).hexdigest()
@@ -0,0 +1,180 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import pickle
+import time
+from collections import Counter, OrderedDict
+
+import frappe
+from redis import Redis
+from books_integration.metrics import incr
+
+REFERENCE_FIELDS = [
+    "name",
+    "document_type",
+    "document_name",
+    "books_name",
+    "payload_hash",
+    "field_hashes",
+]
+LOCAL_CACHE_SIZE = 10000
+# seconds a worker trusts its own copy of a reference written by another worker
+LOCAL_CACHE_TTL = 30
+# bounds how long an entry left by a crashed, rolled back job can survive
+REDIS_CACHE_TTL = 24 * 60 * 60
+METRICS_FLUSH_EVERY = 100
+# cached for names that have no reference yet, dropped when one is written
+NOT_SYNCED = {}
+# an invoice keeps the doctype it was created as when the invoice mode changes
+INVOICE_DOCTYPES = ("Sales Invoice", "POS Invoice")
+
+_local_cache = OrderedDict()
+_stats = Counter()
+
+
+def get_erpn_reference(instance, document_type, document_name):
+    """Returns the Books Reference of an ERPNext document, or None."""
+    return _get_reference(
+        instance,
+        _erpn_field(document_type, document_name),
+        {"document_type": document_type, "document_name": document_name},
+    )
+
+
+def get_books_reference(instance, books_name, document_type=None):
+    """Returns the Books Reference of a Books record, or None. Without
+    `document_type` any reference with the Books name matches."""
+    filters = {"books_name": books_name}
+    if document_type:
+        filters["document_type"] = document_type
+
+    return _get_reference(instance, _books_field(books_name, document_type), filters)
+
+
+def get_record_reference(instance, books_name, document_type):
+    """Returns the Books Reference of an inbound record of the doctype. An
+    invoice is matched under either invoice doctype, its own first."""
+    for reference_doctype in get_reference_doctypes(document_type):
+        if reference := get_books_reference(instance, books_name, reference_doctype):
+            return reference
+
+
+def get_reference_doctypes(document_type):
+    """Returns the doctypes a record of the doctype may be referenced as."""
+    if document_type not in INVOICE_DOCTYPES:
+        return (document_type,)
+
+    return (document_type, *(doctype for doctype in INVOICE_DOCTYPES if doctype != document_type))
+
+
+def reference_changed(instance, *references):
+    """Drops the cached entries of references being written, with their old
+    and new values. The write may still be rolled back to a savepoint, so
+    it is not cached; the next lookup reads it back. The entries are
+    dropped again on commit, in case another worker cached the old values
+    in between."""
+    for reference in references:
+        invalidate_reference(instance, reference)
+
+    frappe.db.after_commit.add(
+        lambda: [invalidate_reference(instance, reference) for reference in references]
+    )
+
+
+def invalidate_reference(instance, reference):
+    # a lookup without a doctype may have matched this reference
+    for field in (
+        _erpn_field(reference.get("document_type"), reference.get("document_name")),
+        _books_field(reference.get("books_name"), reference.get("document_type")),
+        _books_field(reference.get("books_name")),
+    ):
+        _delete(instance, field)
+
+
+def clear_reference_cache(instance=None):
+    if instance:
+        frappe.cache.delete_value(_get_key(instance))
+    else:
+        frappe.cache.delete_keys("books_reference|")
+
+    _local_cache.clear()
+
+
+def flush_reference_cache_metrics():
+    for stat, count in _stats.items():
+        incr(f"reference_cache.{stat}", count)
+
+    _stats.clear()
+
+
+def _get_reference(instance, field, filters):
+    local_key = (frappe.local.site, instance, field)
+    entry = _local_cache.get(local_key)
+    if entry and entry[0] > time.monotonic():
+        _local_cache.move_to_end(local_key)
+        _count("local_hits")
+        return entry[1]
+
+    row = _hget(instance, field)
+    if row is None:
+        _count("misses")
+        row = frappe.db.get_value(
+            "Books Reference",
+            {**filters, "books_instance": instance},
+            REFERENCE_FIELDS,
+            as_dict=True,
+        ) or NOT_SYNCED
+        _hset(instance, field, row)
+    else:
+        _count("negative_hits" if row == NOT_SYNCED else "hits")
+
+    if row == NOT_SYNCED:
+        return None
+
+    _set_local(instance, field, row)
+    return row
+
+
+def _set_local(instance, field, row):
+    local_key = (frappe.local.site, instance, field)
+    _local_cache[local_key] = (time.monotonic() + LOCAL_CACHE_TTL, row)
+    _local_cache.move_to_end(local_key)
+    if len(_local_cache) > LOCAL_CACHE_SIZE:
+        _local_cache.popitem(last=False)
+
+
+def _hget(instance, field):
+    # read from redis every time, frappe.cache.hget would keep the first
+    # value it reads for the rest of the job and miss other workers' writes
+    value = Redis.hget(frappe.cache, frappe.cache.make_key(_get_key(instance)), field)
+    return pickle.loads(value) if value is not None else None
+
+
+def _hset(instance, field, row):
+    key = frappe.cache.make_key(_get_key(instance))
+    Redis.hset(frappe.cache, key, field, pickle.dumps(row))
+    frappe.cache.expire(key, REDIS_CACHE_TTL)
+
+
+def _delete(instance, field):
+    frappe.cache.hdel(_get_key(instance), field)
+    _local_cache.pop((frappe.local.site, instance, field), None)
+
+
+def _count(stat):
+    _stats[stat] += 1
+    _stats["lookups"] += 1
+    if _stats["lookups"] >= METRICS_FLUSH_EVERY:
+        flush_reference_cache_metrics()
+
+
+def _get_key(instance):
+    return f"books_reference|{instance}"
+
+
+def _erpn_field(document_type, document_name):
+    return f"erpn|{document_type}|{document_name}"
+
+
+def _books_field(books_name, document_type=None):
+    return f"books|{document_type or ''}|{books_name}"
@@ -0,0 +1,90 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import now_datetime
+from books_integration.sync_queue import (
+    OUTBOUND_DOCTYPES,
+    get_sync_instances,
+    iter_document_names,
+    queue_documents,
+)
+
+
+def enqueue_resync_job(job_name):
+    frappe.enqueue(
+        "books_integration.resync.run_resync_job",
+        queue="long",
+        timeout=4 * 60 * 60,
+        enqueue_after_commit=True,
+        job_id=f"BOOKS_RESYNC_JOB|{job_name}",
+        deduplicate=True,
+        resync_job=job_name,
+    )
+
+
+def resume_resync_jobs():
+    """Re-enqueues jobs whose worker died, they carry on from their cursor."""
+    for job_name in frappe.get_all(
+        "Books Resync Job", filters={"status": ("in", ("Queued", "Running"))}, pluck="name"
+    ):
+        enqueue_resync_job(job_name)
+
+
+def run_resync_job(resync_job):
+    """Queues every document of the job's doctypes for its instances, a page
+    at a time. The cursor is saved with each page so a job that stops
+    resumes after the last page it queued."""
+    job = frappe.get_doc("Books Resync Job", resync_job)
+    if job.status in ("Completed", "Failed"):
+        return
+
+    doctypes = get_resync_doctypes(job)
+    if job.status == "Queued":
+        job.db_set({
+            "status": "Running",
+            "started_at": now_datetime(),
+            "total_count": sum(frappe.db.count(doctype) for doctype in doctypes),
+        }, commit=True)
+
+    try:
+        for doctype in doctypes:
+            # without an instance, to the ones the doctype is synced to
+            instances = [job.books_instance] if job.books_instance else get_sync_instances(doctype)
+            after = job.last_name if doctype == job.current_doctype else ""
+            for names in iter_document_names(doctype, after=after):
+                for instance in instances:
+                    queue_documents(instance, doctype, names)
+
+                job.db_set({
+                    "current_doctype": doctype,
+                    "last_name": names[-1],
+                    "processed_count": job.processed_count + len(names),
+                }, commit=True)
+                publish_resync_progress(job)
+    except Exception:
+        frappe.db.rollback()
+        job.db_set({"status": "Failed", "error": frappe.get_traceback()}, commit=True)
+        return
+
+    job.db_set({"status": "Completed", "completed_at": now_datetime()}, commit=True)
+
+
+def get_resync_doctypes(job):
+    doctypes = [job.document_type] if job.document_type else list(OUTBOUND_DOCTYPES)
+    if job.current_doctype in doctypes:
+        # doctypes before the cursor are already queued
+        doctypes = doctypes[doctypes.index(job.current_doctype):]
+
+    return doctypes
+
+
+def publish_resync_progress(job):
+    frappe.publish_progress(
+        min(job.processed_count * 100 / (job.total_count or 1), 100),
+        title=_("Re-syncing masters"),
+        doctype="Books Resync Job",
+        docname=job.name,
+        description=_("{0} of {1} documents queued").format(job.processed_count, job.total_count),
+    )
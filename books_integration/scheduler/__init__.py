@@ -1,70 +1,299 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+import datetime
 import frappe
-import json
+import gzip
+import time
+from decimal import Decimal
+from frappe.query_builder.functions import Max
+from frappe.utils import add_days, add_to_date, cint, flt, now_datetime
+from pypika.terms import ExistsCriterion
+from books_integration.batching import FINANCIAL_LANE, LANES, MASTER_LANE, update_record_cost
 from books_integration.doc_converter import init_doc_converter
-from books_integration.utils import get_doctype_name, update_books_reference, pretty_json
-
+from books_integration.metrics import incr, observe
+from books_integration.reference_cache import (
+    flush_reference_cache_metrics, get_books_reference, get_record_reference, reference_changed
+)
+from books_integration.scheduler.errors import record_error
+from books_integration.scheduler.pos_invoice import (
+    POS_PAYMENT_DOCTYPE, apply_pos_invoice_payment, get_pos_invoice_references,
+    set_pos_invoice_cashier
+)
+from books_integration.scheduler.submission import (
+    enqueue_deferred_submission, submit_dependencies, submit_or_defer
+)
+from books_integration.utils import (
+    get_doctype_name, update_books_reference, compress_payload, load_payload, compact_json,
+    get_payload_hash, iter_payload
+)
+
+ARCHIVE_CHUNK_SIZE = 500
+RECORD_SAVEPOINT = "books_record"
+LAST_INSTANCE_CACHE_KEY = "books_sync_last_instance"
+MAX_JOB_DURATION = 20 * 60
+# the log being processed when MAX_JOB_DURATION runs out is finished first
+JOB_TIMEOUT = MAX_JOB_DURATION + 10 * 60
+# minutes
+MAX_RETRY_BACKOFF = 24 * 60
+PRIMARY_DOCTYPES = ("SalesInvoice", "POSOpeningShift", "ItemGroup")
+
+
+def enqueue_process_transactions(lane=None):
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    queues = {
+        FINANCIAL_LANE: settings.financial_records_queue or "default",
+        MASTER_LANE: settings.master_records_queue or "long",
+    }
 
-def enqueue_process_transactions():
-    frappe.enqueue(
-        "books_integration.scheduler.process_transactions",
-        queue="long",
-        enqueue_after_commit=True,
-        job_id="BOOKS_SYNC_TRANSACTION_JOB",
-        deduplicate=True
-    )
+    for lane in [lane] if lane else LANES:
+        frappe.enqueue(
+            "books_integration.scheduler.process_transactions",
+            queue=queues[lane],
+            timeout=JOB_TIMEOUT,
+            enqueue_after_commit=True,
+            job_id=f"BOOKS_SYNC_TRANSACTION_JOB::{lane}",
+            deduplicate=True,
+            lane=lane
+        )
 
 
-def process_transactions():
-    log = frappe.db.get_value(
-        "Books Integration Log",
-        {"processed": 0},
-        ["name", "data", "books_instance"],
-        as_dict=True
+def process_transactions(lane=None):
+    started_at = time.monotonic()
+    while log := claim_next_log(lane):
+        process_log(log)
+        # stop before the job times out, the next push or hourly run continues
+        if time.monotonic() - started_at > MAX_JOB_DURATION:
+            break
+
+    flush_reference_cache_metrics()
+    if lane == MASTER_LANE:
+        # financial logs held back for these masters can run now
+        enqueue_process_transactions(FINANCIAL_LANE)
+    enqueue_deferred_submission()
+
+
+def claim_next_log(lane=None):
+    """Picks the oldest log of the next instance in round robin order,
+    only considering instances with logs of the highest pending priority.
+    Priority only chooses the instance; within it logs run in the order
+    they were received, so a shift never runs ahead of its invoices."""
+    log = frappe.qb.DocType("Books Integration Log")
+    conditions = log.processed == 0
+    if lane:
+        conditions &= log.lane == lane
+
+    if lane == FINANCIAL_LANE:
+        # records may refer to masters received before or with them in the
+        # other lane, a request's logs share its sync time
+        master_log = frappe.qb.DocType("Books Integration Log").as_("master_log")
+        conditions &= ExistsCriterion(
+            frappe.qb.from_(master_log)
+            .select(master_log.name)
+            .where(master_log.lane == MASTER_LANE)
+            .where(master_log.processed == 0)
+            .where(master_log.books_instance == log.books_instance)
+            .where(master_log.sync_time <= log.sync_time)
+        ).negate()
+
+    pending = (
+        frappe.qb.from_(log)
+        .select(log.books_instance, Max(log.priority).as_("priority"))
+        .where(conditions)
+        .groupby(log.books_instance)
+        .run(as_dict=True)
     )
-    if not log:
+    if not pending:
         return
 
-    frappe.db.set_value("Books Integration Log", log.name, "processed", 1)
-    data = json.loads(log.data)
-    primary_doctypes = ["SalesInvoice", "POSOpeningShift", "ItemGroup"]
-    primary_docs = [row for row in data if row.get("doctype") in primary_doctypes]
-    secondary_docs = [row for row in data if row.get("doctype") not in primary_doctypes]
+    top_priority = max(cint(row.priority) for row in pending)
+    instances = sorted(
+        row.books_instance for row in pending if cint(row.priority) == top_priority
+    )
+    cache_key = f"{LAST_INSTANCE_CACHE_KEY}|{lane}"
+    last_instance = frappe.cache.get_value(cache_key)
+    instance = next((name for name in instances if name > (last_instance or "")), instances[0])
+
+    claimed = (
+        frappe.qb.from_(log)
+        .select(log.name, log.data, log.books_instance, log.processed_upto)
+        .where(conditions)
+        .where(log.books_instance == instance)
+        .orderby(log.creation)
+        .limit(1)
+        .for_update(skip_locked=True)
+        .run(as_dict=True)
+    )
+    frappe.cache.set_value(cache_key, instance)
+
+    return claimed[0] if claimed else None
+
+
+def process_log(log):
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    commit_every = cint(settings.commit_every_records) or 1
+    # without an interval, groups are committed by size alone
+    commit_interval = cint(settings.commit_interval_ms) / 1000
+
     frappe.flags.in_books_process = True
-    for record in primary_docs+secondary_docs:
+
+    # a resumed log skips the records committed before the last run stopped
+    processed_upto = cint(log.processed_upto)
+    record_count = 0
+    uncommitted = 0
+    last_commit = time.monotonic()
+    for idx, record in enumerate(iter_log_records(log)):
+        record_count = idx + 1
+        if idx < processed_upto:
+            continue
+
+        started_at = time.monotonic()
+        frappe.db.savepoint(RECORD_SAVEPOINT)
+        doctype = None
         try:
             doctype = get_doctype_name(record.get("doctype"), "erpn")
             process_data(log.books_instance, record, doctype)
         except Exception:
-            frappe.get_doc({
-                "doctype": "Books Error Log",
-                "error": frappe.get_traceback(),
-                "data": pretty_json(record),
-                "document_type": doctype,
-                "books_instance": log.books_instance,
-                "books_integration_log": log.name
-            }).insert(ignore_permissions=True)
-
+            frappe.db.rollback(save_point=RECORD_SAVEPOINT)
+            log_record_error(log.books_instance, record, doctype, log.name)
+        else:
+            frappe.db.release_savepoint(RECORD_SAVEPOINT)
+
+        duration = time.monotonic() - started_at
+        update_record_cost(record, duration)
+        observe("inbound.record", duration)
+
+        uncommitted += 1
+        if uncommitted >= commit_every or (
+            commit_interval and time.monotonic() - last_commit >= commit_interval
+        ):
+            frappe.db.set_value("Books Integration Log", log.name, "processed_upto", idx + 1)
+            frappe.db.commit()
+            uncommitted = 0
+            last_commit = time.monotonic()
+
+    frappe.db.set_value(
+        "Books Integration Log",
+        log.name,
+        {"processed": 1, "processed_upto": record_count}
+    )
+    frappe.db.commit()
     frappe.flags.in_books_process = False
 
 
+def iter_log_records(log):
+    """Yields the records of the log, those other records depend on first.
+    The payload is parsed lazily once per pass instead of being copied.
+    A payload that can't be read ends the log early and is logged, as it
+    would fail the same way on every run."""
+    try:
+        for record in iter_payload(log.data):
+            if record.get("doctype") in PRIMARY_DOCTYPES:
+                yield record
+
+        for record in iter_payload(log.data):
+            if record.get("doctype") not in PRIMARY_DOCTYPES:
+                yield record
+    except Exception:
+        frappe.log_error(
+            title=f"Books Integration Error - {log.books_instance} - Unreadable Log {log.name}",
+            message=frappe.get_traceback(),
+        )
+        incr("inbound.unreadable_logs")
+
+
+def log_record_error(instance, record, doctype, integration_log=None):
+    # the traceback is kept once per fingerprint in the Books Error Summary
+    details = record_error(doctype, record)
+    frappe.get_doc({
+        "doctype": "Books Error Log",
+        "error": details.error,
+        "error_fingerprint": details.fingerprint,
+        "data": compress_payload(record),
+        "document_type": doctype,
+        "books_instance": instance,
+        "books_integration_log": integration_log,
+        "next_retry_at": get_next_retry_at(0),
+    }).insert(ignore_permissions=True)
+
+
+def get_next_retry_at(attempts):
+    backoff = cint(frappe.db.get_single_value("Books Sync Settings", "retry_backoff_minutes")) or 5
+    return add_to_date(now_datetime(), minutes=min(backoff * 2 ** attempts, MAX_RETRY_BACKOFF))
+
+
+def archive_integration_logs():
+    retention_days = cint(
+        frappe.db.get_single_value("Books Sync Settings", "log_retention_days")
+    )
+    if not retention_days:
+        return
+
+    cutoff = add_days(now_datetime(), -retention_days)
+    log = frappe.qb.DocType("Books Integration Log")
+    error_log = frappe.qb.DocType("Books Error Log")
+    # logs with pending error logs are kept for retries
+    referenced_logs = (
+        frappe.qb.from_(error_log)
+        .select(error_log.books_integration_log)
+        .where(error_log.books_integration_log.isnotnull())
+    )
+
+    while True:
+        logs = (
+            frappe.qb.from_(log)
+            .select(log.name, log.books_instance, log.sync_time, log.data)
+            .where(log.processed == 1)
+            .where(log.creation < cutoff)
+            .where(log.name.notin(referenced_logs))
+            .orderby(log.creation)
+            .limit(ARCHIVE_CHUNK_SIZE)
+            .run(as_dict=True)
+        )
+        if not logs:
+            break
+
+        write_log_archive(logs)
+        frappe.db.delete(
+            "Books Integration Log", {"name": ("in", [row.name for row in logs])}
+        )
+        frappe.db.commit()
+
+
+def write_log_archive(logs):
+    lines = []
+    for row in logs:
+        row.data = load_payload(row.data)
+        lines.append(compact_json(row))
+
+    file_name = "books-integration-log-{0}.jsonl.gz".format(
+        now_datetime().strftime("%Y%m%d%H%M%S%f")
+    )
+    frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "is_private": 1,
+        "content": gzip.compress("\n".join(lines).encode()),
+    }).save(ignore_permissions=True)
+
+
 def process_data(instance, data, doctype):
+    ref_exists = get_record_reference(instance, data.get("name"), doctype)
+    payload_hash = get_payload_hash(data)
+    if ref_exists and ref_exists.payload_hash == payload_hash:
+        incr("inbound.duplicates")
+        return
+
+    if doctype == "Payment Entry" and (references := get_pos_invoice_references(instance, data)):
+        # payments against POS Invoices are applied once, with the invoice
+        if not get_books_reference(instance, data.get("name"), POS_PAYMENT_DOCTYPE):
+            apply_pos_invoice_payment(instance, data, references, payload_hash)
+        return
+
     conv_doc = init_doc_converter(instance, data, "erpn")
     if not conv_doc:
         return
 
-    ref_exists = frappe.db.get_value(
-        "Books Reference",
-        {
-            "document_type": doctype,
-            "books_name": data.get("name"),
-            "books_instance": instance
-        },
-        "document_name"
-    )
-
     if not ref_exists:
         create_record(
             conv_doc,
@@ -72,21 +301,31 @@ def process_data(instance, data, doctype):
             data.get("submitted"),
             data.get("cancelled"),
             data.get("doctype"),
-            instance
+            instance,
+            payload_hash
         )
+        incr("inbound.created")
         return
 
-    _doc = frappe.get_doc(doctype, ref_exists)
-    _doc.update(conv_doc.get_converted_doc())
+    # updated as the doctype it was created as, the invoice mode may have changed
+    doctype = conv_doc.target_doctype = ref_exists.document_type
+    converted_doc = conv_doc.get_converted_doc()
+    _doc = frappe.get_doc(doctype, ref_exists.document_name)
     _doc.flags.ignore_permissions = True
-    _doc.run_method("set_missing_values")
-    _doc.save()
+    if doc_has_changes(_doc, converted_doc):
+        _doc.update(converted_doc)
+        _doc.run_method("set_missing_values")
+        _doc.save()
+        incr("inbound.updated")
+    else:
+        incr("inbound.unchanged")
 
     if (
         data.get("submitted")
         and _doc.meta.is_submittable
+        and _doc.docstatus == 0
     ):
-        _doc.submit()
+        submit_or_defer(_doc, data.get("cancelled"))
 
     if (
         data.get("cancelled")
@@ -94,6 +333,46 @@ def process_data(instance, data, doctype):
     ):
         _doc.cancel()
 
+    frappe.db.set_value("Books Reference", ref_exists.name, "payload_hash", payload_hash)
+    reference_changed(instance, ref_exists)
+
+
+def doc_has_changes(doc, converted_doc):
+    """Compares the fields set by the converter with the stored document."""
+    for fieldname, value in converted_doc.items():
+        if fieldname in ("doctype", "name"):
+            continue
+
+        current = doc.get(fieldname)
+        if not isinstance(value, list):
+            if normalize_value(value) != normalize_value(current):
+                return True
+            continue
+
+        current = current or []
+        if len(value) != len(current):
+            return True
+
+        for row, current_row in zip(value, current):
+            for child_fieldname, child_value in row.items():
+                if normalize_value(child_value) != normalize_value(current_row.get(child_fieldname)):
+                    return True
+
+    return False
+
+
+def normalize_value(value):
+    if value in (None, ""):
+        return None
+
+    if isinstance(value, (bool, int, float, Decimal)):
+        return flt(value, 9)
+
+    if isinstance(value, (datetime.date, datetime.timedelta)):
+        return str(value)
+
+    return value
+
 
 # def create_record(
 #     _doc, ref, submit, cancel, doctype, instance
@@ -120,7 +399,7 @@ def process_data(instance, data, doctype):
 #     }
 #     update_books_reference(instance, reference)
 
-def create_record(_doc, ref, submit, cancel, doctype, instance):
+def create_record(_doc, ref, submit, cancel, doctype, instance, payload_hash=None):
     # 🔍 Validate raw data BEFORE creating doc
     data = _doc.data if hasattr(_doc, "data") else {}
 
@@ -129,19 +408,23 @@ def create_record(_doc, ref, submit, cancel, doctype, instance):
             frappe.log_error(f"Missing customer in Sales Invoice: {ref}", "Books Integration Error")
             return  # Or: frappe.throw("Customer is required for Sales Invoice")
 
+    # before conversion, which looks up the submitted invoices it refers to
+    submit_dependencies(instance, _doc.target_doctype, _doc.doc_dict)
     doc = _doc.get_frappe_doc()
     doc.flags.ignore_permissions = True
 
     doc.run_method("set_missing_values")
     frappe.log_error("Sales Invoice Insert Debug", f"[Books Integration] About to insert doc: {doc.as_dict()}")
     doc.insert()
+    if doc.doctype == "POS Invoice":
+        set_pos_invoice_cashier(doc, instance)
 
     other_docs = ["POS Opening Entry", "POS Closing Entry"]
     if doc.doctype in other_docs:
         doc.submit()
 
     if submit and doc.meta.is_submittable:
-        doc.submit()
+        submit_or_defer(doc, cancel)
 
     if cancel and doc.docstatus == 1:
         doc.cancel()
@@ -149,7 +432,8 @@ def create_record(_doc, ref, submit, cancel, doctype, instance):
     reference = {
         "doctype": doctype,
         "name": doc.name,
-        "books_name": ref
+        "books_name": ref,
+        "payload_hash": payload_hash
     }
     update_books_reference(instance, reference)
 
@@ -0,0 +1,113 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import hashlib
+import re
+import sys
+
+import frappe
+from frappe.utils import now_datetime, strip_html
+from books_integration.utils import compress_payload, load_payload
+
+MAX_SAMPLES = 3
+QUOTED_VALUE = re.compile(r"'[^']*'|\"[^\"]*\"")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def get_error_details(document_type):
+    """Fingerprints the exception being handled by its type, the converted
+    doctype and its message with record specific values masked."""
+    exc = sys.exc_info()[1]
+    exception_type = type(exc).__name__
+    message = normalize_error_message(str(exc))
+    fingerprint = hashlib.sha1(
+        f"{exception_type}:{document_type}:{message}".encode()
+    ).hexdigest()[:16]
+
+    return frappe._dict(
+        fingerprint=fingerprint,
+        exception_type=exception_type,
+        message=message,
+        error=f"{exception_type}: {strip_html(str(exc))}",
+    )
+
+
+def normalize_error_message(message):
+    message = strip_html(message)
+    message = QUOTED_VALUE.sub("?", message)
+    message = NUMBER.sub("N", message)
+    return " ".join(message.split())[:140]
+
+
+def record_error(document_type, record, counted_fingerprint=None):
+    """Counts the exception being handled in its Books Error Summary and
+    returns its details. A retry that fails the same way as before, with
+    `counted_fingerprint`, is not counted again."""
+    details = get_error_details(document_type)
+    now = now_datetime()
+    increment = 0 if details.fingerprint == counted_fingerprint else 1
+
+    # one statement, so concurrent lanes hitting a new fingerprint do not
+    # both insert it
+    summary = frappe.qb.DocType("Books Error Summary")
+    query = frappe.qb.into(summary).columns(
+        summary.name,
+        summary.error_fingerprint,
+        summary.exception_type,
+        summary.document_type,
+        summary.message,
+        summary.error_count,
+        summary.first_seen,
+        summary.last_seen,
+        summary.sample_traceback,
+        summary.sample_data,
+        summary.creation,
+        summary.modified,
+        summary.owner,
+        summary.modified_by,
+    ).insert(
+        details.fingerprint,
+        details.fingerprint,
+        details.exception_type,
+        document_type,
+        details.message,
+        1,
+        now,
+        now,
+        frappe.get_traceback(),
+        compress_payload([record]),
+        now,
+        now,
+        frappe.session.user,
+        frappe.session.user,
+    )
+    updates = ((summary.error_count, summary.error_count + increment), (summary.last_seen, now))
+    if frappe.db.db_type == "postgres":
+        query = query.on_conflict(summary.name)
+        for field, value in updates:
+            query = query.do_update(field, value)
+    else:
+        for field, value in updates:
+            query = query.on_duplicate_key_update(field, value)
+    query.run()
+
+    if increment:
+        add_error_sample(details.fingerprint, record)
+
+    return details
+
+
+def add_error_sample(fingerprint, record):
+    error_count, sample_data = frappe.db.get_value(
+        "Books Error Summary", fingerprint, ["error_count", "sample_data"]
+    )
+    # the first sample is written with the summary
+    if 1 < error_count <= MAX_SAMPLES:
+        samples = load_payload(sample_data) or []
+        frappe.db.set_value(
+            "Books Error Summary",
+            fingerprint,
+            "sample_data",
+            compress_payload(samples + [record]),
+            update_modified=False,
+        )
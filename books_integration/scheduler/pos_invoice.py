@@ -0,0 +1,73 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import flt
+from books_integration.doc_converter import init_doc_converter
+from books_integration.metrics import incr
+from books_integration.reference_cache import get_books_reference
+from books_integration.scheduler.submission import is_fully_paid, submit_pending_document
+from books_integration.utils import update_books_reference
+from erpnext.accounts.doctype.sales_invoice.sales_invoice import get_bank_cash_account
+
+# Books payments against POS Invoices are referenced by the payment row they add
+POS_PAYMENT_DOCTYPE = "Sales Invoice Payment"
+
+
+def set_pos_invoice_cashier(doc, instance):
+    # POS Closing Entry only accepts invoices created by its user
+    pos_user = frappe.db.get_value("Books Instance", instance, "pos_user")
+    if pos_user:
+        doc.db_set("owner", pos_user, update_modified=False)
+
+
+def get_pos_invoice_references(instance, data):
+    """Returns the POS Invoices a Books payment is made against, or None
+    if it is against any other document."""
+    references = []
+    for row in data.get("for") or []:
+        reference = get_books_reference(instance, row.get("referenceName"))
+        if not reference or reference.document_type != "POS Invoice":
+            return None
+
+        references.append((reference.document_name, flt(row.get("amount"))))
+
+    return references or None
+
+
+def apply_pos_invoice_payment(instance, data, references, payload_hash=None):
+    """Adds a Books payment as a row of the payments table of the POS
+    Invoices it is against, instead of creating a Payment Entry, and
+    submits the ones it pays in full."""
+    conv_doc = init_doc_converter(instance, data, "erpn")
+    mode_of_payment = conv_doc.get_erp_payment_method(data.get("paymentMethod"))
+
+    payment_rows = []
+    for invoice_name, amount in references:
+        invoice = frappe.get_doc("POS Invoice", invoice_name)
+        if invoice.docstatus != 0:
+            continue
+
+        invoice.flags.ignore_permissions = True
+        # a row per Books payment, so each can be referenced on its own
+        payment = invoice.append("payments", {
+            "mode_of_payment": mode_of_payment,
+            "account": get_bank_cash_account(mode_of_payment, invoice.company).get("account"),
+            "amount": -abs(amount) if invoice.is_return else amount,
+        })
+        invoice.save()
+        payment_rows.append(payment.name)
+
+        if invoice.books_pending_submit and is_fully_paid(invoice):
+            submit_pending_document("POS Invoice", invoice.name)
+
+    if not payment_rows:
+        return
+
+    update_books_reference(instance, {
+        "document_type": POS_PAYMENT_DOCTYPE,
+        "name": payment_rows[0],
+        "books_name": data.get("name"),
+        "payload_hash": payload_hash,
+    })
+    incr("inbound.pos_payments")
@@ -0,0 +1,196 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import time
+
+import frappe
+from frappe.query_builder import Case
+from frappe.utils import add_to_date, cint, now_datetime
+from books_integration.metrics import incr
+from books_integration.reference_cache import get_reference_doctypes
+from books_integration.scheduler import (
+    JOB_TIMEOUT,
+    MAX_JOB_DURATION,
+    RECORD_SAVEPOINT,
+    get_next_retry_at,
+    process_data,
+)
+from books_integration.scheduler.errors import record_error
+from books_integration.utils import get_payload_hash, load_payload
+
+RETRY_BATCH_SIZE = 200
+# records other records depend on are retried first
+PRIORITY_DOCUMENT_TYPES = (
+    "POS Opening Entry",
+    "Item Group",
+    "Address",
+    "Customer",
+    "Sales Invoice",
+)
+RETRY_FILTERS = ("books_instance", "document_type", "error_fingerprint")
+RETRY_JOB_ID = "BOOKS_ERROR_LOG_RETRY_JOB"
+
+
+def retry_failed_records():
+    max_attempts = cint(
+        frappe.db.get_single_value("Books Sync Settings", "retry_max_attempts")
+    )
+    if not max_attempts:
+        return
+
+    frappe.enqueue(
+        "books_integration.scheduler.retry.retry_error_logs",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        job_id=RETRY_JOB_ID,
+        deduplicate=True,
+        max_attempts=max_attempts,
+    )
+
+
+@frappe.whitelist(methods=["POST"])
+def enqueue_error_log_retry(books_instance=None, document_type=None, error_fingerprint=None):
+    """Makes matching error logs due now, regardless of their attempts,
+    and retries them in the background."""
+    frappe.only_for("System Manager")
+    filters = get_retry_filters(books_instance, document_type, error_fingerprint)
+
+    error_log = frappe.qb.DocType("Books Error Log")
+    query = frappe.qb.update(error_log).set(error_log.next_retry_at, now_datetime())
+    for fieldname, value in filters.items():
+        query = query.where(error_log[fieldname] == value)
+    query.run()
+
+    frappe.enqueue(
+        "books_integration.scheduler.retry.retry_error_logs",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        enqueue_after_commit=True,
+        job_id="::".join([RETRY_JOB_ID, *filters.values()]),
+        deduplicate=True,
+        filters=filters,
+    )
+    frappe.msgprint(frappe._("Retry of matching Books Error Logs has been queued"))
+
+
+def retry_error_logs(filters=None, max_attempts=None):
+    started_at = time.monotonic()
+    frappe.flags.in_books_process = True
+    while error_logs := claim_due_error_logs(filters, max_attempts):
+        for error_log in error_logs:
+            retry_error_log(error_log)
+
+        frappe.db.commit()
+        if time.monotonic() - started_at > MAX_JOB_DURATION:
+            break
+
+    frappe.flags.in_books_process = False
+
+
+def claim_due_error_logs(filters=None, max_attempts=None):
+    """Returns a batch of due error logs no other job is retrying, claimed
+    for this job until it would have timed out."""
+    now = now_datetime()
+    error_log = frappe.qb.DocType("Books Error Log")
+    query = (
+        frappe.qb.from_(error_log)
+        .select(
+            error_log.name,
+            error_log.books_instance,
+            error_log.document_type,
+            error_log.data,
+            error_log.attempts,
+            error_log.error_fingerprint,
+            error_log.creation,
+        )
+        .where(
+            error_log.next_retry_at.isnull()
+            | (error_log.next_retry_at <= now)
+        )
+        .where(error_log.claimed_until.isnull() | (error_log.claimed_until < now))
+        .orderby(
+            Case().when(error_log.document_type.isin(PRIORITY_DOCUMENT_TYPES), 0).else_(1)
+        )
+        .orderby(error_log.creation)
+        .limit(RETRY_BATCH_SIZE)
+        .for_update(skip_locked=True)
+    )
+    for fieldname, value in (filters or {}).items():
+        query = query.where(error_log[fieldname] == value)
+
+    if max_attempts:
+        query = query.where(error_log.attempts < max_attempts)
+
+    error_logs = query.run(as_dict=True)
+    if error_logs:
+        (
+            frappe.qb.update(error_log)
+            .set(error_log.claimed_until, add_to_date(now, seconds=JOB_TIMEOUT))
+            .where(error_log.name.isin([row.name for row in error_logs]))
+        ).run()
+        # the claims must be seen by other jobs before the records are retried
+        frappe.db.commit()
+
+    return error_logs
+
+
+def retry_error_log(error_log):
+    data = load_payload(error_log.data)
+    if is_superseded(error_log, data):
+        # applied since, or replaced by a newer version of the record
+        frappe.db.delete("Books Error Log", error_log.name)
+        incr("retry.superseded")
+        return True
+
+    frappe.db.savepoint(RECORD_SAVEPOINT)
+    try:
+        process_data(error_log.books_instance, data, error_log.document_type)
+    except Exception:
+        frappe.db.rollback(save_point=RECORD_SAVEPOINT)
+        attempts = cint(error_log.attempts) + 1
+        details = record_error(error_log.document_type, data, error_log.error_fingerprint)
+        frappe.db.set_value(
+            "Books Error Log",
+            error_log.name,
+            {
+                "attempts": attempts,
+                "error": details.error,
+                "error_fingerprint": details.fingerprint,
+                "next_retry_at": get_next_retry_at(attempts),
+                "claimed_until": None,
+            },
+        )
+        incr("retry.failed")
+        return False
+
+    frappe.db.release_savepoint(RECORD_SAVEPOINT)
+    frappe.db.delete("Books Error Log", error_log.name)
+    incr("retry.succeeded")
+    return True
+
+
+def is_superseded(error_log, data):
+    """Whether the record's reference was written after the error log, by
+    this payload or a newer one."""
+    reference = frappe.db.get_value(
+        "Books Reference",
+        {
+            "books_instance": error_log.books_instance,
+            "document_type": ("in", get_reference_doctypes(error_log.document_type)),
+            "books_name": data.get("name"),
+        },
+        ["payload_hash", "modified"],
+        as_dict=True,
+    )
+    if not reference:
+        return False
+
+    return (
+        reference.payload_hash == get_payload_hash(data)
+        or reference.modified > error_log.creation
+    )
+
+
+def get_retry_filters(books_instance=None, document_type=None, error_fingerprint=None):
+    values = (books_instance, document_type, error_fingerprint)
+    return {fieldname: value for fieldname, value in zip(RETRY_FILTERS, values) if value}
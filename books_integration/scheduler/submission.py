@@ -0,0 +1,199 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import time
+
+import frappe
+from frappe.utils import cint, flt, getdate
+from books_integration.doc_converter import get_converted_datetime_str
+from books_integration.metrics import incr, observe
+from books_integration.reference_cache import get_books_reference
+
+# submitted in this order so payments find their invoices submitted
+DEFERRED_DOCTYPES = ("Sales Invoice", "Payment Entry")
+# inbound doctypes that need the invoices they refer to submitted
+DEPENDENT_DOCTYPES = ("Payment Entry", "Delivery Note", "POS Closing Entry")
+SUBMISSION_ORDER = {
+    "Sales Invoice": "posting_date asc, posting_time asc, creation asc",
+    "Payment Entry": "posting_date asc, creation asc",
+}
+SUBMIT_SAVEPOINT = "books_submit"
+MAX_SUBMISSION_DURATION = 20 * 60
+
+
+def is_submission_deferred(doctype):
+    return doctype in DEFERRED_DOCTYPES and cint(
+        frappe.get_cached_doc("Books Sync Settings").deferred_submission
+    )
+
+
+def defer_submission(doc):
+    doc.db_set("books_pending_submit", 1, update_modified=False)
+    incr("submission.deferred")
+
+
+def submit_or_defer(doc, cancel=False):
+    """Submits an inbound document, unless it is to be submitted later."""
+    if doc.doctype == "POS Invoice" and not is_fully_paid(doc):
+        # submitted when its payments arrive, a cancelled one stays a draft
+        if not cancel:
+            defer_submission(doc)
+        return
+
+    if is_submission_deferred(doc.doctype) and not cancel:
+        defer_submission(doc)
+        return
+
+    doc.submit()
+
+
+def is_fully_paid(doc):
+    invoice_total = flt(doc.rounded_total) or flt(doc.grand_total)
+    return abs(flt(doc.paid_amount)) >= abs(invoice_total) - 0.01
+
+
+def enqueue_deferred_submission():
+    if not cint(frappe.get_cached_doc("Books Sync Settings").deferred_submission):
+        return
+
+    frappe.enqueue(
+        "books_integration.scheduler.submission.submit_pending_documents",
+        queue="long",
+        enqueue_after_commit=True,
+        job_id="BOOKS_DEFERRED_SUBMISSION_JOB",
+        deduplicate=True,
+    )
+
+
+def submit_pending_documents():
+    """Submits the drafts left by deferred submission, company by company,
+    committing after every batch."""
+    started_at = time.monotonic()
+    frappe.flags.in_books_process = True
+    for company in get_pending_companies():
+        submit_company_documents(company, commit=True)
+        if time.monotonic() - started_at > MAX_SUBMISSION_DURATION:
+            # the next run picks up the remaining companies
+            enqueue_deferred_submission()
+            break
+
+    frappe.flags.in_books_process = False
+
+
+def submit_dependencies(instance, doctype, record):
+    """Submits the pending documents a Books record refers to before it is
+    converted, as the converter and ERPNext need them submitted."""
+    if doctype not in DEPENDENT_DOCTYPES:
+        return
+
+    if not cint(frappe.get_cached_doc("Books Sync Settings").deferred_submission):
+        return
+
+    for dependency in get_pending_dependencies(instance, doctype, record):
+        submit_pending_document(dependency.doctype, dependency.name)
+
+
+def get_pending_dependencies(instance, doctype, record):
+    """Returns the pending documents the record refers to, in submission
+    order: the invoices a payment or delivery is against, or the invoices
+    and payments of the shift a closing ends."""
+    if doctype == "POS Closing Entry":
+        return get_pending_shift_documents(instance, record)
+
+    if doctype == "Payment Entry":
+        books_names = [row.get("referenceName") for row in record.get("for") or []]
+    else:
+        books_names = [record.get("backReference")]
+
+    dependencies = []
+    for books_name in filter(None, books_names):
+        reference = get_books_reference(instance, books_name)
+        if (
+            reference
+            and reference.document_type in DEFERRED_DOCTYPES
+            and frappe.db.get_value(reference.document_type, reference.document_name, "books_pending_submit")
+        ):
+            dependencies.append(frappe._dict(doctype=reference.document_type, name=reference.document_name))
+
+    return dependencies
+
+
+def get_pending_shift_documents(instance, record):
+    closing_date = getdate(get_converted_datetime_str(record.get("closingDate")))
+    dependencies = []
+    for doctype in DEFERRED_DOCTYPES:
+        dependencies.extend(
+            frappe._dict(doctype=doctype, name=name)
+            for name in frappe.get_all(
+                doctype,
+                filters={
+                    "books_pending_submit": 1,
+                    "docstatus": 0,
+                    "books_instance": instance,
+                    "posting_date": ("<=", closing_date),
+                },
+                order_by=SUBMISSION_ORDER[doctype],
+                pluck="name",
+            )
+        )
+
+    return dependencies
+
+
+def submit_company_documents(company, commit=True):
+    batch_size = cint(frappe.get_cached_doc("Books Sync Settings").submission_batch_size) or 100
+    for doctype in DEFERRED_DOCTYPES:
+        while names := get_pending_documents(doctype, company, batch_size):
+            for name in names:
+                submit_pending_document(doctype, name)
+
+            if commit:
+                frappe.db.commit()
+
+
+def get_pending_companies():
+    companies = set()
+    for doctype in DEFERRED_DOCTYPES:
+        companies.update(
+            frappe.get_all(
+                doctype,
+                filters={"books_pending_submit": 1, "docstatus": 0},
+                pluck="company",
+                distinct=True,
+            )
+        )
+
+    return sorted(companies)
+
+
+def get_pending_documents(doctype, company, limit):
+    return frappe.get_all(
+        doctype,
+        filters={"books_pending_submit": 1, "docstatus": 0, "company": company},
+        order_by=SUBMISSION_ORDER[doctype],
+        limit=limit,
+        pluck="name",
+    )
+
+
+def submit_pending_document(doctype, name):
+    started_at = time.monotonic()
+    frappe.db.savepoint(SUBMIT_SAVEPOINT)
+    try:
+        doc = frappe.get_doc(doctype, name)
+        doc.flags.ignore_permissions = True
+        doc.books_pending_submit = 0
+        doc.submit()
+    except Exception:
+        frappe.db.rollback(save_point=SUBMIT_SAVEPOINT)
+        # left as a draft to be fixed and submitted by hand
+        frappe.db.set_value(doctype, name, "books_pending_submit", 0, update_modified=False)
+        frappe.log_error(
+            title=f"Books Integration Error - Deferred Submission of {doctype} {name}",
+            message=frappe.get_traceback(),
+        )
+        incr("submission.failed")
+        return
+
+    frappe.db.release_savepoint(SUBMIT_SAVEPOINT)
+    observe("submission.submit", time.monotonic() - started_at)
@@ -0,0 +1,131 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils.caching import site_cache
+from books_integration.doc_converter import get_converter_class
+from books_integration.utils import get_doctype_name
+
+NUMERIC_FIELDTYPES = ("Int", "Float", "Currency", "Percent")
+
+
+def clear_record_schema_cache():
+    """Drops the compiled schemas of the site, its doctypes may have changed."""
+    get_record_schema.clear_cache()
+
+
+@site_cache()
+def get_record_schema(doctype):
+    """Compiles the schema of an inbound Books record from its converter's
+    field map and the field types of the ERPNext doctypes it maps to."""
+    converter = get_converter_class(doctype)
+    target_doctype = get_doctype_name(doctype, "erpn")
+    if not converter or not target_doctype:
+        return None
+
+    field_map = dict(converter.field_map)
+    child_tables = field_map.pop("child_tables", [])
+    schema = frappe._dict(
+        required=converter.required_fields,
+        fields=get_field_types(target_doctype, field_map),
+        child_tables={},
+    )
+
+    for child_table in child_tables:
+        fieldname = child_table.get("fbooks_fieldname")
+        schema.child_tables[fieldname] = frappe._dict(
+            required=converter.required_child_fields.get(fieldname, ()),
+            fields=get_field_types(child_table.get("erpn_doctype"), child_table.get("fieldmap")),
+        )
+
+    return schema
+
+
+def get_field_types(doctype, field_map):
+    meta = frappe.get_meta(doctype)
+    field_types = {}
+    for erpn_fieldname, books_fieldname in field_map.items():
+        df = meta.get_field(erpn_fieldname)
+        if not df:
+            continue
+
+        if df.fieldtype in NUMERIC_FIELDTYPES:
+            field_types[books_fieldname] = "number"
+        elif df.fieldtype == "Check":
+            field_types[books_fieldname] = "check"
+
+    return field_types
+
+
+def validate_record(record):
+    """Returns the reasons an inbound record cannot be processed."""
+    if not isinstance(record, dict):
+        return [_("Record must be an object")]
+
+    doctype = record.get("doctype")
+    if not doctype or not isinstance(doctype, str):
+        return [_("doctype is required")]
+
+    if not get_doctype_name(doctype, "erpn", record):
+        return [_("{0} is not a doctype synced from Books").format(doctype)]
+
+    schema = get_record_schema(doctype)
+    if not schema:
+        return []
+
+    errors = validate_values(record, schema)
+    for fieldname, child_schema in schema.child_tables.items():
+        rows = record.get(fieldname)
+        if rows is None:
+            continue
+
+        if not isinstance(rows, list):
+            errors.append(_("{0} must be a list").format(fieldname))
+            continue
+
+        for idx, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                errors.append(_("{0} row {1} must be an object").format(fieldname, idx))
+                continue
+
+            errors.extend(
+                _("{0} row {1}: {2}").format(fieldname, idx, error)
+                for error in validate_values(row, child_schema)
+            )
+
+    return errors
+
+
+def validate_values(values, schema):
+    errors = []
+    for fieldname in schema.required:
+        if values.get(fieldname) in (None, "", []):
+            errors.append(_("{0} is required").format(fieldname))
+
+    for fieldname, value_type in schema.fields.items():
+        value = values.get(fieldname)
+        if value in (None, ""):
+            continue
+
+        if value_type == "number" and not is_number(value):
+            errors.append(_("{0} must be a number").format(fieldname))
+        elif value_type == "check" and value not in (0, 1, True, False):
+            errors.append(_("{0} must be a boolean").format(fieldname))
+
+    return errors
+
+
+def is_number(value):
+    if isinstance(value, bool):
+        return False
+
+    if isinstance(value, (int, float)):
+        return True
+
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+
+    return True
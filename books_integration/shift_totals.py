@@ -0,0 +1,122 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+
+def set_pos_shift(doc, method=None):
+    """Books an inbound document to its instance's open POS shift, so its
+    payments are counted there even if it is submitted or cancelled after
+    the shift has closed."""
+    if doc.get("from_frappebooks") and doc.get("books_instance"):
+        doc.books_pos_opening_entry = get_open_shift(doc.books_instance)
+
+
+def update_shift_totals(doc, method=None):
+    """Adds the payments of an inbound document to the totals of its POS
+    shift when it is submitted, and takes them back out of the same shift
+    when it is cancelled."""
+    if not doc.get("from_frappebooks") or not doc.get("books_instance"):
+        return
+
+    if doc.get("is_consolidated"):
+        # merged from POS Invoices whose payments are already counted
+        return
+
+    amounts = get_payment_amounts(doc)
+    if not amounts:
+        return
+
+    # documents inserted before shifts were stored count to the open shift
+    opening_entry = doc.get("books_pos_opening_entry") or get_open_shift(doc.books_instance)
+    if not opening_entry:
+        return
+
+    if not doc.get("books_pos_opening_entry"):
+        doc.db_set("books_pos_opening_entry", opening_entry, update_modified=False)
+
+    sign = -1 if method == "on_cancel" else 1
+    for mode_of_payment, amount in amounts.items():
+        add_shift_total(opening_entry, doc.books_instance, mode_of_payment, sign * amount, sign)
+
+
+def get_payment_amounts(doc):
+    if doc.doctype == "Payment Entry":
+        if not doc.mode_of_payment:
+            return {}
+
+        amount = flt(doc.paid_amount)
+        return {doc.mode_of_payment: amount if doc.payment_type == "Receive" else -amount}
+
+    amounts = {}
+    for row in doc.get("payments") or []:
+        if flt(row.amount):
+            amounts[row.mode_of_payment] = amounts.get(row.mode_of_payment, 0) + flt(row.amount)
+
+    return amounts
+
+
+def get_open_shift(instance):
+    return frappe.db.get_value(
+        "POS Opening Entry",
+        {"books_instance": instance, "docstatus": 1, "status": "Open"},
+        "name",
+        order_by="period_start_date desc",
+    )
+
+
+def add_shift_total(opening_entry, instance, mode_of_payment, amount, count=1):
+    """Adds to the total of the shift and mode of payment in one statement,
+    so concurrent submits neither fail on its name nor lose an increment."""
+    now = now_datetime()
+    shift_total = frappe.qb.DocType("Books Shift Total")
+    query = frappe.qb.into(shift_total).columns(
+        shift_total.name,
+        shift_total.pos_opening_entry,
+        shift_total.books_instance,
+        shift_total.mode_of_payment,
+        shift_total.collected_amount,
+        shift_total.payment_count,
+        shift_total.creation,
+        shift_total.modified,
+        shift_total.owner,
+        shift_total.modified_by,
+    ).insert(
+        # the doctype's naming format
+        f"{opening_entry}-{mode_of_payment}",
+        opening_entry,
+        instance,
+        mode_of_payment,
+        amount,
+        count,
+        now,
+        now,
+        frappe.session.user,
+        frappe.session.user,
+    )
+    updates = (
+        (shift_total.collected_amount, shift_total.collected_amount + amount),
+        (shift_total.payment_count, shift_total.payment_count + count),
+        (shift_total.modified, now),
+    )
+    if frappe.db.db_type == "postgres":
+        query = query.on_conflict(shift_total.name)
+        for field, value in updates:
+            query = query.do_update(field, value)
+    else:
+        for field, value in updates:
+            query = query.on_duplicate_key_update(field, value)
+    query.run()
+
+
+def get_shift_totals(opening_entry):
+    """Returns the amount collected per mode of payment during the shift."""
+    return dict(
+        frappe.get_all(
+            "Books Shift Total",
+            filters={"pos_opening_entry": opening_entry},
+            fields=["mode_of_payment", "collected_amount"],
+            as_list=True,
+        )
+    )
@@ -0,0 +1,311 @@
+# Copyright (c) 2026, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import gzip
+import io
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import frappe
+from frappe.utils import add_to_date, cint, create_batch, now_datetime
+from books_integration.api.sync import get_item_rates
+from books_integration.delta import get_field_hashes
+from books_integration.doc_converter import init_doc_converter
+from books_integration.reconciliation import add_reconciliation_keys, get_reconciled_doctypes
+from books_integration.sync_queue import (
+    OUTBOUND_DOCTYPES, get_sync_instances, iter_document_names, queue_documents
+)
+from books_integration.utils import compact_json, update_books_references
+
+SNAPSHOT_DOCTYPES = OUTBOUND_DOCTYPES
+SNAPSHOT_PAGE_SIZE = 500
+# documents sent to a worker process at a time
+CONVERSION_CHUNK_SIZE = 100
+SNAPSHOTS_KEPT = 2
+SNAPSHOT_BUILD_TIMEOUT = 4 * 60 * 60
+
+
+@frappe.whitelist(methods=["POST"])
+def enqueue_snapshot_build():
+    frappe.only_for("System Manager")
+    queue_snapshot_build()
+    frappe.msgprint(frappe._("Books Snapshot build has been queued"))
+
+
+def queue_snapshot_build():
+    frappe.enqueue(
+        "books_integration.snapshot.build_snapshot",
+        queue="long",
+        timeout=SNAPSHOT_BUILD_TIMEOUT,
+        enqueue_after_commit=True,
+        job_id="BOOKS_SNAPSHOT_BUILD_JOB",
+        deduplicate=True,
+    )
+
+
+def build_snapshot():
+    """Writes all outbound masters, converted for Books, to a compressed
+    JSON lines file attached to a new Books Snapshot."""
+    fail_stale_snapshots()
+    snapshot = frappe.get_doc({
+        "doctype": "Books Snapshot",
+        "status": "Building",
+        "built_at": now_datetime(),
+    }).insert(ignore_permissions=True)
+    # documents are read after this, so changes made during the build are
+    # caught up from `built_at`
+    frappe.db.commit()
+
+    try:
+        record_count, content = write_snapshot(snapshot)
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": f"books-snapshot-{snapshot.name}.jsonl.gz",
+            "attached_to_doctype": "Books Snapshot",
+            "attached_to_name": snapshot.name,
+            "attached_to_field": "snapshot_file",
+            "is_private": 1,
+            "content": content,
+        }).save(ignore_permissions=True)
+        snapshot.db_set({
+            "status": "Ready",
+            "record_count": record_count,
+            "snapshot_file": file_doc.file_url,
+        })
+    except Exception:
+        frappe.db.rollback()
+        snapshot.db_set({"status": "Failed", "error": frappe.get_traceback()})
+
+    frappe.db.commit()
+    delete_old_snapshots()
+
+
+def write_snapshot(snapshot):
+    record_count = 0
+    with tempfile.TemporaryFile() as buffer:
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as snapshot_file:
+            snapshot_file.write(compact_json({
+                "version": snapshot.name,
+                "built_at": snapshot.built_at,
+                "doctypes": SNAPSHOT_DOCTYPES,
+            }).encode() + b"\n")
+            for lines, count in iter_converted_chunks():
+                snapshot_file.write(lines)
+                record_count += count
+
+        buffer.seek(0)
+        return record_count, buffer.read()
+
+
+def iter_converted_chunks():
+    """Yields chunks of snapshot lines in document order. Documents are
+    read here a page at a time and converted by a pool of processes, each
+    with its own connection for the lookups the converters make."""
+    item_rates = get_item_rates() or {}
+    chunks = iter_document_chunks(item_rates)
+    workers = get_snapshot_workers()
+    if workers == 1:
+        for chunk in chunks:
+            yield convert_chunk(*chunk)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_snapshot_worker,
+        initargs=(frappe.local.site, frappe.local.sites_path),
+    ) as executor:
+        # bounded, so only a few pages are held in memory at a time
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(convert_chunk, *chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_snapshot_workers():
+    workers = cint(frappe.get_cached_doc("Books Sync Settings").snapshot_workers)
+    return workers or os.cpu_count() or 1
+
+
+def init_snapshot_worker(site, sites_path):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+
+
+def iter_document_chunks(item_rates):
+    for doctype in SNAPSHOT_DOCTYPES:
+        for names in iter_document_names(doctype, SNAPSHOT_PAGE_SIZE):
+            docs = prefetch_documents(doctype, names)
+            lookups = get_page_lookups(doctype, docs)
+            for chunk in create_batch(docs, CONVERSION_CHUNK_SIZE):
+                rates = {}
+                if doctype == "Item":
+                    rates = {doc.item_code: item_rates.get(doc.item_code, 0) for doc in chunk}
+
+                yield doctype, chunk, rates, lookups
+
+
+def prefetch_documents(doctype, names):
+    """Returns the documents as plain dicts with their child rows, reading
+    each table once for the page instead of once per document."""
+    docs = {
+        doc.name: doc
+        for doc in frappe.get_all(doctype, filters={"name": ("in", names)}, fields=["*"])
+    }
+    for doc in docs.values():
+        doc.doctype = doctype
+
+    for df in frappe.get_meta(doctype).get_table_fields():
+        for doc in docs.values():
+            doc[df.fieldname] = []
+
+        for row in frappe.get_all(
+            df.options,
+            filters={"parent": ("in", names), "parenttype": doctype, "parentfield": df.fieldname},
+            fields=["*"],
+            order_by="idx asc",
+        ):
+            if row.parent in docs:
+                docs[row.parent][df.fieldname].append(row)
+
+    return [docs[name] for name in names if name in docs]
+
+
+def get_page_lookups(doctype, docs):
+    """Returns the values the converters would otherwise query for each
+    document of the page."""
+    if doctype == "Item":
+        return {
+            "whole_uoms": set(
+                frappe.get_all("UOM", filters={"must_be_whole_number": 1}, pluck="name")
+            )
+        }
+
+    if doctype == "Batch":
+        return {
+            "item_names": dict(
+                frappe.get_all(
+                    "Item",
+                    filters={"name": ("in", list({doc.item for doc in docs}))},
+                    fields=["name", "item_name"],
+                    as_list=True,
+                )
+            )
+        }
+
+    return {}
+
+
+def convert_chunk(doctype, docs, item_rates, lookups=None):
+    """Returns the snapshot lines of the documents, and their count."""
+    lines = []
+    for doc in docs:
+        record = init_doc_converter(None, doc, "fbooks", lookups).get_converted_doc()
+        if doctype == "Item":
+            record["rate"] = item_rates.get(record.get("itemCode"), 0)
+
+        add_reconciliation_keys(record, doc)
+        lines.append(compact_json({
+            "document_type": doctype,
+            "document_name": doc.name,
+            "record": record,
+        }))
+
+    return "".join(f"{line}\n" for line in lines).encode(), len(lines)
+
+
+def fail_stale_snapshots():
+    """Marks builds that outlived the job timeout as failed, their worker
+    was killed before it could record the failure."""
+    snapshot = frappe.qb.DocType("Books Snapshot")
+    (
+        frappe.qb.update(snapshot)
+        .set(snapshot.status, "Failed")
+        .set(snapshot.error, "The build was stopped before it finished")
+        .where(snapshot.status == "Building")
+        .where(snapshot.built_at < add_to_date(now_datetime(), seconds=-SNAPSHOT_BUILD_TIMEOUT))
+    ).run()
+
+
+def get_latest_snapshot():
+    snapshots = frappe.get_all(
+        "Books Snapshot",
+        filters={"status": "Ready"},
+        fields=["name", "built_at", "record_count", "snapshot_file"],
+        order_by="creation desc",
+        limit=1,
+    )
+    return snapshots[0] if snapshots else None
+
+
+def iter_snapshot_file(snapshot_name):
+    file_doc = frappe.get_doc(
+        "File", {"attached_to_doctype": "Books Snapshot", "attached_to_name": snapshot_name}
+    )
+    with gzip.GzipFile(fileobj=io.BytesIO(file_doc.get_content())) as snapshot_file:
+        # skips the header
+        next(snapshot_file, None)
+        for line in snapshot_file:
+            yield frappe.parse_json(line)
+
+
+def apply_snapshot(instance, snapshot):
+    """Records the snapshot's documents as synced to the instance and queues
+    the ones changed since it was built, for the doctypes the instance
+    syncs."""
+    doctypes = get_reconciled_doctypes(instance)
+    lines = (line for line in iter_snapshot_file(snapshot.name) if line.document_type in doctypes)
+    for lines in create_batch(lines, SNAPSHOT_PAGE_SIZE):
+        update_books_references(instance, [
+            {
+                "document_type": line.document_type,
+                "name": line.document_name,
+                "books_name": line.record.get("fbooksDocName") or line.record.get("name"),
+                "field_hashes": compact_json(get_field_hashes(line.record)),
+            }
+            for line in lines
+        ])
+
+    if doctypes:
+        frappe.db.delete(
+            "Books Sync Queue",
+            {"books_instance": instance, "document_type": ("in", doctypes)},
+        )
+    queue_changes_since(instance, snapshot.built_at, doctypes)
+    frappe.db.set_value(
+        "Books Instance",
+        instance,
+        {"snapshot_version": snapshot.name, "snapshot_applied_at": now_datetime()},
+    )
+
+
+def queue_changes_since(instance, since, doctypes):
+    for doctype in doctypes:
+        names = set(frappe.get_all(doctype, filters={"modified": (">=", since)}, pluck="name"))
+        if doctype == "Item" and instance in get_sync_instances("Item Price"):
+            # item rates are synced with the item, as add_item queues them
+            names.update(
+                frappe.get_all("Item Price", filters={"modified": (">=", since)}, pluck="item_code")
+            )
+
+        queue_documents(instance, doctype, names)
+
+
+def delete_old_snapshots():
+    for name in frappe.get_all(
+        "Books Snapshot",
+        order_by="creation desc",
+        start=SNAPSHOTS_KEPT,
+        limit=100,
+        pluck="name",
+    ):
+        frappe.delete_doc("Books Snapshot", name, ignore_permissions=True, force=True)
+
+    frappe.db.commit()
@@ -1,7 +1,34 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+from graphlib import TopologicalSorter
+
 import frappe
+from frappe.query_builder import Case
+from frappe.utils import add_to_date, cint, create_batch, now_datetime
+
+QUEUE_INSERT_BATCH_SIZE = 500
+# masters synced to Books, with the ones their records refer to
+OUTBOUND_DEPENDENCIES = {
+    "UOM": (),
+    "Item Group": (),
+    "Item": ("UOM", "Item Group"),
+    "Batch": ("Item",),
+    "Pricing Rule": ("Item",),
+}
+# in the order Books needs them
+OUTBOUND_DOCTYPES = tuple(TopologicalSorter(OUTBOUND_DEPENDENCIES).static_order())
+SYNC_DOCTYPES = (
+    "Item", "Item Group", "Batch", "UOM", "Pricing Rule", "Price List", "Customer", "Supplier",
+    "Sales Invoice", "Payment Entry", "Stock Entry", "Serial No", "Delivery Note",
+)
+# doctypes synced when any of these rows is
+SYNC_DOCTYPE_ALIASES = {
+    "Item Price": ("Price List",),
+    "Mode of Payment": ("Sales Invoice", "Payment Entry"),
+}
+OUTBOUND_SYNC_TYPES = ("Two Way", "ERPNext to Books")
+SYNC_DECISIONS_CACHE_KEY = "books_sync_decisions"
 
 
 def add_doc_to_sync_queue(doc, method=None):
@@ -11,108 +38,230 @@ def add_doc_to_sync_queue(doc, method=None):
     if doc.meta.is_submittable and doc.docstatus == 0:
         return
 
-    if not document_should_sync(doc.doctype):
-        return
+    for instance in get_sync_instances(doc.doctype):
+        queue_documents(instance, doc.doctype, [doc.name])
 
-    instances = frappe.db.get_all(
-        "Books Instance",
-        # filters={"enable_sync": 1},
-        pluck="name",
-    )
-    for instance in instances:
-        is_exists_in_queue = frappe.db.exists(
-            {
-                "doctype": "Books Sync Queue",
-                "document_name": doc.name,
-                "document_type": doc.doctype,
-                "books_instance": instance,
-            }
-        )
-        if not is_exists_in_queue:
-            frappe.get_doc(
-                {
-                    "doctype": "Books Sync Queue",
-                    "document_name": doc.name,
-                    "document_type": doc.doctype,
-                    "books_instance": instance,
-                }
-            ).insert()
-
-        if doc.doctype == "Item":
-            item_batches = frappe.db.get_all("Batch", {"item": doc.name}, "name")
-            for batch in item_batches:
-                frappe.get_doc(
-                    {
-                        "doctype": "Books Sync Queue",
-                        "document_name": batch.get("name"),
-                        "document_type": "Batch",
-                        "books_instance": instance,
-                    }
-                ).insert()
+    if doc.doctype == "Item" and (batch_instances := get_sync_instances("Batch")):
+        item_batches = frappe.db.get_all("Batch", {"item": doc.name}, pluck="name")
+        for instance in batch_instances:
+            queue_documents(instance, "Batch", item_batches)
 
 
 def document_should_sync(doctype):
-    settings = frappe.get_cached_doc("Books Sync Settings")
+    return bool(get_sync_instances(doctype))
+
+
+def get_sync_instances(doctype):
+    """Returns the instances changes to the doctype are queued for."""
+    decisions = frappe.cache.get_value(SYNC_DECISIONS_CACHE_KEY, generator=build_sync_decisions)
+    instances = set()
+    for sync_doctype in SYNC_DOCTYPE_ALIASES.get(doctype, (doctype,)):
+        instances.update(decisions.get(sync_doctype) or ())
+
+    return sorted(instances)
+
+
+def build_sync_decisions():
+    """Compiles Books Sync Settings and the instances' own filters into the
+    instances each document type is synced to."""
+    settings = frappe.get_single("Books Sync Settings")
     if not settings.enable_sync:
-        return False
+        return {}
+
+    allowed = get_outbound_doctypes(settings.sync_docs)
+    instance_rows = {}
+    for row in frappe.get_all(
+        "Books Sync Document",
+        filters={"parenttype": "Books Instance", "parentfield": "sync_docs"},
+        fields=["parent", "document_type", "sync_type"],
+    ):
+        instance_rows.setdefault(row.parent, []).append(row)
+
+    decisions = {}
+    for instance in frappe.get_all("Books Instance", filters={"enable_sync": 1}, pluck="name"):
+        instance_allowed = get_outbound_doctypes(instance_rows.get(instance))
+        for doctype in allowed & instance_allowed:
+            decisions.setdefault(doctype, []).append(instance)
+
+    return decisions
+
+
+def get_outbound_doctypes(sync_docs):
+    """Returns the doctypes the rows sync from ERPNext, every one if there are none."""
+    if not sync_docs:
+        return set(SYNC_DOCTYPES)
 
-    if doctype == "Item Price":
-        doctype = ["Price List"]
-    elif doctype == "Mode of Payment":
-        doctype = ["Sales Invoice", "Payment Entry"]
-    else:
-        doctype = [doctype]
+    return {
+        row.document_type for row in sync_docs
+        if (row.sync_type or "Two Way") in OUTBOUND_SYNC_TYPES
+    }
 
-    # for row in settings.sync_docs:
-    #     if row.document_type in doctype:
-    #         return True
-    return True
 
-    # return False
+def clear_sync_decisions():
+    frappe.cache.delete_value(SYNC_DECISIONS_CACHE_KEY)
+    # again once the change is committed, in case another worker compiled
+    # the old settings in between
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(SYNC_DECISIONS_CACHE_KEY))
+
 
 def add_item(doc, method=None):
-# runs when item price is modified
-    instances = frappe.db.get_all(
-        "Books Instance",
-        # filters={"enable_sync": 1},
+    # runs when item price is modified, for instances that sync both
+    for instance in set(get_sync_instances("Item")) & set(get_sync_instances(doc.doctype)):
+        queue_documents(instance, "Item", [doc.item_code])
+
+
+def sync_existing_items(instance):
+    """Queues every Item for the instance, in a resumable Books Resync Job."""
+    return frappe.get_doc({
+        "doctype": "Books Resync Job",
+        "books_instance": instance,
+        "document_type": "Item",
+    }).insert(ignore_permissions=True)
+
+
+def iter_document_names(doctype, page_size=QUEUE_INSERT_BATCH_SIZE, after=""):
+    """Yields pages of document names in name order, keyed on the last name
+    of the previous page."""
+    last_name = after or ""
+    while names := frappe.get_all(
+        doctype,
+        filters={"name": (">", last_name)},
+        order_by="name asc",
+        limit=page_size,
         pluck="name",
-    )
-    for instance in instances:
-        is_exists_in_queue = frappe.db.exists(
-            {
-                "doctype": "Books Sync Queue",
-                "document_name": doc.item_code,
-                "document_type": "Item",
+    ):
+        yield names
+        last_name = names[-1]
+
+
+def queue_documents(instance, doctype, names):
+    """Adds a queue row for each of the documents not queued for the
+    instance yet, a batch of rows per insert. Rows already handed out are
+    marked to be sent again, as Books has an older version."""
+    for batch in create_batch(sorted(set(filter(None, names))), QUEUE_INSERT_BATCH_SIZE):
+        queued_rows = frappe.get_all(
+            "Books Sync Queue",
+            filters={
                 "books_instance": instance,
-            }
+                "document_type": doctype,
+                "document_name": ("in", batch),
+            },
+            fields=["name", "document_name", "leased_until"],
         )
-        if not is_exists_in_queue:
-            frappe.get_doc(
-            {
-                "doctype": "Books Sync Queue",
-                "document_name": doc.item_code,
-                "document_type": "Item",
-                "books_instance": instance,
-            }
-            ).insert()
+        queued = {row.document_name for row in queued_rows}
+        if leased := [row.name for row in queued_rows if row.leased_until]:
+            queue = frappe.qb.DocType("Books Sync Queue")
+            (
+                frappe.qb.update(queue)
+                .set(queue.changed_while_leased, 1)
+                .where(queue.name.isin(leased))
+            ).run()
 
-def sync_existing_items(instance):
-    all_items = frappe.db.get_all("Item")
-    for item in all_items:
-        is_exists_in_queue = frappe.db.exists(
-            {
-                "doctype": "Books Sync Queue",
-                "document_name": item.item_code,
-                "document_type": "Item",
-                "books_instance": instance,
-            }
+        now = now_datetime()
+        rows = [
+            (
+                frappe.generate_hash(length=10), doctype, name, instance,
+                now, now, frappe.session.user, frappe.session.user,
+            )
+            for name in batch
+            if name not in queued
+        ]
+        if rows:
+            frappe.db.bulk_insert(
+                "Books Sync Queue",
+                fields=[
+                    "name", "document_type", "document_name", "books_instance",
+                    "creation", "modified", "owner", "modified_by",
+                ],
+                values=rows,
+            )
+
+
+def lease_queued_docs(instance):
+    """Returns a page of the instance's queued rows that are not leased, and
+    leases them, so polls skip them until they are acknowledged or the lease
+    runs out."""
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    now = now_datetime()
+    queue = frappe.qb.DocType("Books Sync Queue")
+    dependency_order = Case()
+    for idx, doctype in enumerate(OUTBOUND_DOCTYPES):
+        dependency_order = dependency_order.when(queue.document_type == doctype, idx)
+
+    query = (
+        frappe.qb.from_(queue)
+        .select(queue.name, queue.document_type, queue.document_name, queue.books_instance)
+        .where(queue.books_instance == instance)
+        .where(queue.leased_until.isnull() | (queue.leased_until < now))
+        .orderby(dependency_order.else_(len(OUTBOUND_DOCTYPES)))
+        .orderby(queue.creation)
+        # overlapping polls take different rows
+        .for_update(skip_locked=True)
+    )
+    if blocked := get_blocked_doctypes(instance, now):
+        query = query.where(queue.document_type.notin(blocked))
+
+    if page_size := cint(settings.pending_docs_page_size):
+        query = query.limit(page_size)
+
+    rows = query.run(as_dict=True)
+    lease_seconds = cint(settings.pending_docs_lease_seconds)
+    if rows and lease_seconds:
+        (
+            frappe.qb.update(queue)
+            .set(queue.leased_until, add_to_date(now, seconds=lease_seconds))
+            .set(queue.changed_while_leased, 0)
+            .where(queue.name.isin([row.name for row in rows]))
+        ).run()
+        # the leases are written by a GET request, which is not committed otherwise
+        frappe.local.flags.commit = True
+
+    return rows
+
+
+def acknowledge_queued_doc(name):
+    """Removes a row Books has applied, unless its document changed after
+    it was handed out, in which case the row is released to be sent again."""
+    queue = frappe.qb.DocType("Books Sync Queue")
+    (
+        frappe.qb.from_(queue)
+        .delete()
+        .where(queue.name == name)
+        .where(queue.changed_while_leased == 0)
+    ).run()
+    (
+        frappe.qb.update(queue)
+        .set(queue.leased_until, None)
+        .set(queue.changed_while_leased, 0)
+        .where(queue.name == name)
+    ).run()
+
+
+def get_blocked_doctypes(instance, now):
+    """Returns the doctypes that depend on documents handed out to the
+    instance but not acknowledged yet, which are held back until they are."""
+    in_flight = set(
+        frappe.get_all(
+            "Books Sync Queue",
+            filters={"books_instance": instance, "leased_until": (">=", now)},
+            pluck="document_type",
+            distinct=True,
         )
-        if not is_exists_in_queue:
-            frappe.get_doc(
-            {
-                "doctype": "Books Sync Queue",
-                "document_name": item.item_code,
-                "document_type": "Item",
-                "books_instance": instance,
-            }
-            ).insert()
\ No newline at end of file
+    )
+    return [
+        doctype for doctype in OUTBOUND_DOCTYPES
+        if in_flight & get_outbound_dependencies(doctype)
+    ]
+
+
+def get_outbound_dependencies(doctype):
+    """Returns the doctypes a doctype depends on, directly or not."""
+    dependencies = set()
+    pending = list(OUTBOUND_DEPENDENCIES.get(doctype, ()))
+    while pending:
+        dependency = pending.pop()
+        if dependency not in dependencies:
+            dependencies.add(dependency)
+            pending.extend(OUTBOUND_DEPENDENCIES.get(dependency, ()))
+
+    return dependencies
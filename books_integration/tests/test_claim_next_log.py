@@ -0,0 +1,92 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import now_datetime
+from books_integration.api.sync import save_record_batch
+from books_integration.batching import FINANCIAL_LANE, MASTER_LANE
+from books_integration.scheduler import LAST_INSTANCE_CACHE_KEY, claim_next_log
+
+TEST_INSTANCES = ("_Test Books Claim Instance A", "_Test Books Claim Instance B")
+ITEM = {"doctype": "Item", "name": "_Test Books Item"}
+INVOICE = {"doctype": "SalesInvoice", "name": "_Test Books Invoice"}
+CLOSING = {"doctype": "POSClosingShift", "name": "_Test Books Closing"}
+
+
+class TestClaimNextLog(IntegrationTestCase):
+	def setUp(self):
+		for instance in TEST_INSTANCES:
+			if not frappe.db.exists("Books Instance", instance):
+				frappe.get_doc({
+					"doctype": "Books Instance",
+					"device_id": instance,
+					"instance_name": instance,
+				}).insert(ignore_permissions=True)
+
+		frappe.db.delete("Books Integration Log", {"processed": 0})
+		frappe.cache.delete_value(f"{LAST_INSTANCE_CACHE_KEY}|{FINANCIAL_LANE}")
+
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.cache.delete_value(f"{LAST_INSTANCE_CACHE_KEY}|{FINANCIAL_LANE}")
+
+	def save_log(self, instance, record, lane=FINANCIAL_LANE, sync_time=None):
+		save_record_batch(instance, lane, [record], sync_time)
+		return frappe.get_all(
+			"Books Integration Log",
+			filters={"books_instance": instance},
+			order_by="creation desc",
+			limit=1,
+			pluck="name",
+		)[0]
+
+	def claim(self):
+		log = claim_next_log(FINANCIAL_LANE)
+		frappe.db.set_value("Books Integration Log", log.name, "processed", 1)
+		return log.name
+
+	def test_shift_waits_for_older_invoices_of_its_instance(self):
+		instance = TEST_INSTANCES[0]
+		invoice_log = self.save_log(instance, INVOICE)
+		closing_log = self.save_log(instance, CLOSING)
+
+		self.assertEqual(self.claim(), invoice_log)
+		self.assertEqual(self.claim(), closing_log)
+
+	def test_priority_picks_the_instance(self):
+		other_log = self.save_log(TEST_INSTANCES[0], INVOICE)
+		invoice_log = self.save_log(TEST_INSTANCES[1], INVOICE)
+		closing_log = self.save_log(TEST_INSTANCES[1], CLOSING)
+
+		self.assertEqual(self.claim(), invoice_log)
+		self.assertEqual(self.claim(), closing_log)
+		self.assertEqual(self.claim(), other_log)
+
+	def test_instances_take_turns(self):
+		first_logs = [self.save_log(TEST_INSTANCES[0], INVOICE) for _ in range(2)]
+		second_logs = [self.save_log(TEST_INSTANCES[1], INVOICE) for _ in range(2)]
+
+		self.assertEqual(
+			[self.claim() for _ in range(4)],
+			[first_logs[0], second_logs[0], first_logs[1], second_logs[1]],
+		)
+		self.assertIsNone(claim_next_log(FINANCIAL_LANE))
+
+	def test_financial_logs_wait_for_masters_of_the_same_request(self):
+		instance = TEST_INSTANCES[0]
+		sync_time = now_datetime()
+		invoice_log = self.save_log(instance, INVOICE, sync_time=sync_time)
+		item_log = self.save_log(instance, ITEM, MASTER_LANE, sync_time)
+
+		self.assertIsNone(claim_next_log(FINANCIAL_LANE))
+
+		frappe.db.set_value("Books Integration Log", item_log, "processed", 1)
+		self.assertEqual(self.claim(), invoice_log)
+
+	def test_financial_logs_skip_later_masters(self):
+		instance = TEST_INSTANCES[0]
+		invoice_log = self.save_log(instance, INVOICE)
+		self.save_log(instance, ITEM, MASTER_LANE, now_datetime())
+
+		self.assertEqual(self.claim(), invoice_log)
@@ -0,0 +1,70 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from books_integration.delta import get_field_hashes, get_outbound_record, make_patch, pop_sent_hashes
+
+
+class TestDelta(UnitTestCase):
+	def test_field_hashes_skip_patch_keys(self):
+		hashes = get_field_hashes({
+			"doctype": "Item",
+			"books_sync_id": "Q-1",
+			"erpnextModified": "1",
+			"itemCode": "ITEM-1",
+			"rate": 10,
+		})
+
+		self.assertEqual(set(hashes), {"itemCode", "rate"})
+
+	def test_field_hashes_follow_values(self):
+		base = get_field_hashes({"itemCode": "ITEM-1", "rate": 10})
+		changed = get_field_hashes({"itemCode": "ITEM-1", "rate": 12})
+
+		self.assertEqual(base["itemCode"], changed["itemCode"])
+		self.assertNotEqual(base["rate"], changed["rate"])
+
+	def test_patch_has_changed_fields_only(self):
+		base = {"doctype": "Item", "itemCode": "ITEM-1", "rate": 10, "unit": "Nos"}
+		record = {**base, "rate": 12, "books_sync_id": "Q-1"}
+
+		patch = make_patch(record, get_field_hashes(record), get_field_hashes(base))
+
+		self.assertEqual(
+			patch,
+			{"doctype": "Item", "books_sync_id": "Q-1", "rate": 12, "isPatch": 1},
+		)
+
+	def test_patch_unsets_removed_fields(self):
+		base = {"doctype": "Item", "itemCode": "ITEM-1", "barcode": "123"}
+		record = {"doctype": "Item", "itemCode": "ITEM-1"}
+
+		patch = make_patch(record, get_field_hashes(record), get_field_hashes(base))
+
+		self.assertIsNone(patch["barcode"])
+		self.assertNotIn("itemCode", patch)
+
+
+class TestSentHashes(IntegrationTestCase):
+	def test_ack_of_older_version_keeps_newer_hashes(self):
+		# a price change leaves the item's modified time as it was
+		older = {"books_sync_id": "_Test Queue Row", "erpnextModified": "1", "rate": 10}
+		newer = {**older, "rate": 12}
+		get_outbound_record(older, None)
+		get_outbound_record(newer, None)
+
+		self.assertNotEqual(older["sentHash"], newer["sentHash"])
+		self.assertIn(get_field_hashes(older)["rate"], pop_sent_hashes("_Test Queue Row", older["sentHash"]))
+		self.assertIn(get_field_hashes(newer)["rate"], pop_sent_hashes("_Test Queue Row", newer["sentHash"]))
+		self.assertIsNone(pop_sent_hashes("_Test Queue Row", newer["sentHash"]))
+
+	def test_patch_carries_sent_hash(self):
+		base = {"books_sync_id": "_Test Queue Row", "itemCode": "ITEM-1", "rate": 10}
+		reference = {"field_hashes": get_field_hashes(base)}
+		record = {**base, "rate": 12}
+
+		patch = get_outbound_record(record, reference, patches=True)
+
+		self.assertEqual(patch["sentHash"], record["sentHash"])
+		self.assertEqual(patch["rate"], 12)
+		pop_sent_hashes("_Test Queue Row", record["sentHash"])
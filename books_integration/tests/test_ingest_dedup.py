@@ -0,0 +1,78 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from books_integration.api.sync import save_record_batch, split_duplicate_records
+from books_integration.batching import FINANCIAL_LANE
+from books_integration.utils import get_payload_hash, update_books_reference
+
+TEST_INSTANCE = "_Test Books Dedup Instance"
+
+
+class TestIngestDedup(IntegrationTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Books Instance", TEST_INSTANCE):
+			frappe.get_doc({
+				"doctype": "Books Instance",
+				"device_id": TEST_INSTANCE,
+				"instance_name": TEST_INSTANCE,
+			}).insert(ignore_permissions=True)
+
+		frappe.db.delete("Books Integration Log", {"books_instance": TEST_INSTANCE})
+		frappe.db.delete("Books Reference", {"books_instance": TEST_INSTANCE})
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_resend_of_pending_record_is_duplicate(self):
+		record = {"doctype": "UOM", "name": "_Test Books UOM Pending"}
+		save_record_batch(TEST_INSTANCE, FINANCIAL_LANE, [record])
+
+		records, duplicates = split_duplicate_records(TEST_INSTANCE, [record])
+
+		self.assertFalse(records)
+		self.assertEqual(duplicates, [{"doctype": "UOM", "name": record["name"]}])
+
+	def test_changed_record_is_not_duplicate(self):
+		record = {"doctype": "UOM", "name": "_Test Books UOM Changed"}
+		save_record_batch(TEST_INSTANCE, FINANCIAL_LANE, [record])
+		changed = {**record, "isWhole": 1}
+
+		records, duplicates = split_duplicate_records(TEST_INSTANCE, [changed])
+
+		self.assertEqual(records, [changed])
+		self.assertFalse(duplicates)
+
+	def test_processed_log_is_not_pending(self):
+		record = {"doctype": "UOM", "name": "_Test Books UOM Processed"}
+		save_record_batch(TEST_INSTANCE, FINANCIAL_LANE, [record])
+		frappe.db.set_value(
+			"Books Integration Log", {"books_instance": TEST_INSTANCE}, "processed", 1
+		)
+
+		records, _duplicates = split_duplicate_records(TEST_INSTANCE, [record])
+
+		self.assertEqual(records, [record])
+
+	def test_repeat_within_request_is_duplicate(self):
+		record = {"doctype": "UOM", "name": "_Test Books UOM Repeated"}
+
+		records, duplicates = split_duplicate_records(TEST_INSTANCE, [record, record])
+
+		self.assertEqual(records, [record])
+		self.assertEqual(len(duplicates), 1)
+
+	def test_applied_party_is_duplicate(self):
+		record = {"doctype": "Party", "role": "Customer", "name": "_Test Books Party"}
+		update_books_reference(TEST_INSTANCE, {
+			"document_type": "Customer",
+			"name": "_Test Books Party",
+			"books_name": "_Test Books Party",
+			"payload_hash": get_payload_hash(record),
+		})
+
+		records, duplicates = split_duplicate_records(TEST_INSTANCE, [record])
+
+		self.assertFalse(records)
+		self.assertEqual(len(duplicates), 1)
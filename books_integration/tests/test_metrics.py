@@ -0,0 +1,32 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+from frappe.tests import IntegrationTestCase
+from books_integration.metrics import get_metrics, incr, observe, reset_metrics
+
+
+class TestMetrics(IntegrationTestCase):
+	def setUp(self):
+		reset_metrics()
+
+	def tearDown(self):
+		reset_metrics()
+
+	def test_incr_is_read_back(self):
+		incr("inbound.created")
+		incr("inbound.created", 2)
+
+		self.assertEqual(get_metrics()["inbound.created"], 3)
+
+	def test_observe_is_read_back(self):
+		observe("inbound.record", 0.5, count=2)
+
+		metrics = get_metrics()
+		self.assertEqual(metrics["inbound.record.count"], 2)
+		self.assertAlmostEqual(metrics["inbound.record.seconds"], 0.5)
+
+	def test_rates(self):
+		incr("inbound.updated", 3)
+		incr("inbound.unchanged", 1)
+
+		self.assertEqual(get_metrics()["inbound.unchanged_rate"], 0.25)
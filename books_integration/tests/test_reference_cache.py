@@ -0,0 +1,47 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from books_integration.reference_cache import clear_reference_cache, get_record_reference
+from books_integration.utils import update_books_reference
+
+TEST_INSTANCE = "_Test Books Reference Instance"
+
+
+class TestRecordReference(IntegrationTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Books Instance", TEST_INSTANCE):
+			frappe.get_doc({
+				"doctype": "Books Instance",
+				"device_id": TEST_INSTANCE,
+				"instance_name": TEST_INSTANCE,
+			}).insert(ignore_permissions=True)
+
+		frappe.db.delete("Books Reference", {"books_instance": TEST_INSTANCE})
+		clear_reference_cache(TEST_INSTANCE)
+
+	def tearDown(self):
+		frappe.db.rollback()
+		clear_reference_cache(TEST_INSTANCE)
+
+	def test_invoice_is_found_after_invoice_mode_changes(self):
+		update_books_reference(TEST_INSTANCE, {
+			"document_type": "Sales Invoice",
+			"name": "_Test Books SINV",
+			"books_name": "_Test Books Invoice",
+		})
+
+		reference = get_record_reference(TEST_INSTANCE, "_Test Books Invoice", "POS Invoice")
+
+		self.assertEqual(reference.document_type, "Sales Invoice")
+		self.assertEqual(reference.document_name, "_Test Books SINV")
+
+	def test_other_doctypes_are_not_widened(self):
+		update_books_reference(TEST_INSTANCE, {
+			"document_type": "Customer",
+			"name": "_Test Books Customer",
+			"books_name": "_Test Books Party",
+		})
+
+		self.assertIsNone(get_record_reference(TEST_INSTANCE, "_Test Books Party", "Supplier"))
@@ -0,0 +1,27 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+from frappe.tests import IntegrationTestCase
+from books_integration.api.sync import split_invalid_records
+from books_integration.schema import validate_record
+
+
+class TestRecordSchema(IntegrationTestCase):
+	def test_record_without_doctype_is_invalid(self):
+		self.assertTrue(validate_record({"name": "_Test Books Record"}))
+
+	def test_unknown_doctype_is_invalid(self):
+		self.assertTrue(validate_record({"doctype": "Unknown", "name": "_Test Books Record"}))
+
+	def test_party_is_validated_by_role(self):
+		self.assertFalse(validate_record({"doctype": "Party", "role": "Customer", "name": "_Test Books Party"}))
+		self.assertTrue(validate_record({"doctype": "Party", "name": "_Test Books Party"}))
+
+	def test_invalid_records_are_reported_one_by_one(self):
+		valid = {"doctype": "UOM", "name": "_Test Books UOM"}
+
+		records, invalid = split_invalid_records([{"name": "_Test Books Record"}, valid])
+
+		self.assertEqual(records, [valid])
+		self.assertEqual(len(invalid), 1)
+		self.assertIsNone(invalid[0]["doctype"])
@@ -0,0 +1,88 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import json
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+from books_integration.api.sync import stream_transactions
+from books_integration.utils import load_payload
+
+TEST_INSTANCE = "_Test Books Stream Instance"
+
+
+class TestStreamTransactions(IntegrationTestCase):
+	def setUp(self):
+		settings = frappe.get_single("Books Sync Settings")
+		if not settings.mode_of_payment_mapping:
+			settings.append("mode_of_payment_mapping", {
+				"frappebooks_mode_of_payment": "Cash",
+				"erpnext_mode_of_payment": "Cash",
+			})
+		settings.max_pending_logs = 0
+		settings.max_records_per_request = 0
+		settings.rate_limit_records = 0
+		settings.flags.ignore_mandatory = True
+		settings.save(ignore_permissions=True)
+
+		if not frappe.db.exists("Books Instance", TEST_INSTANCE):
+			frappe.get_doc({
+				"doctype": "Books Instance",
+				"device_id": TEST_INSTANCE,
+				"instance_name": TEST_INSTANCE,
+			}).insert(ignore_permissions=True)
+
+		frappe.db.delete("Books Integration Log", {"books_instance": TEST_INSTANCE})
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def post(self, body):
+		frappe.local.request = Request(
+			EnvironBuilder(method="POST", data=body, content_type="application/x-ndjson").get_environ()
+		)
+		return stream_transactions(TEST_INSTANCE)
+
+	def get_logged_records(self):
+		records = []
+		for data in frappe.get_all(
+			"Books Integration Log", filters={"books_instance": TEST_INSTANCE}, pluck="data"
+		):
+			records.extend(load_payload(data))
+
+		return records
+
+	def test_ndjson_body_creates_logs(self):
+		records = [{"doctype": "UOM", "name": f"_Test Books UOM {idx}"} for idx in range(3)]
+		response = self.post("\n".join(json.dumps(record) for record in records).encode())
+
+		self.assertTrue(response["success"])
+		self.assertEqual(response["records"], 3)
+		self.assertEqual(
+			sorted(record["name"] for record in self.get_logged_records()),
+			[record["name"] for record in records],
+		)
+
+	def test_duplicates_across_chunks(self):
+		record = {"doctype": "UOM", "name": "_Test Books UOM Repeated"}
+		with patch("books_integration.api.sync.STREAM_CHUNK_SIZE", 1):
+			response = self.post(json.dumps([record, record]).encode())
+
+		self.assertTrue(response["success"])
+		self.assertEqual(len(response["duplicates"]), 1)
+		self.assertEqual(len(self.get_logged_records()), 1)
+
+	def test_empty_body_is_rejected(self):
+		response = self.post(b"")
+
+		self.assertFalse(response["success"])
+		self.assertFalse(self.get_logged_records())
+
+	def test_truncated_body_is_rejected(self):
+		response = self.post(b'[{"doctype": "UOM", "name": "_Test Books UOM Cut"}')
+
+		self.assertFalse(response["success"])
+		self.assertFalse(self.get_logged_records())
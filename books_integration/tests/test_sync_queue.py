@@ -0,0 +1,141 @@
+# Copyright (c) 2026, Wahni IT Solutions and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import add_to_date, now_datetime
+from books_integration.sync_queue import (
+	OUTBOUND_DOCTYPES,
+	acknowledge_queued_doc,
+	lease_queued_docs,
+	queue_documents,
+)
+
+TEST_INSTANCE = "_Test Books Queue Instance"
+
+
+class TestSyncQueue(IntegrationTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Books Instance", TEST_INSTANCE):
+			frappe.get_doc({
+				"doctype": "Books Instance",
+				"device_id": TEST_INSTANCE,
+				"instance_name": TEST_INSTANCE,
+			}).insert(ignore_permissions=True)
+
+		frappe.db.delete("Books Sync Queue", {"books_instance": TEST_INSTANCE})
+		self.set_settings(page_size=0, lease_seconds=300)
+
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.clear_document_cache("Books Sync Settings", "Books Sync Settings")
+
+	def set_settings(self, page_size, lease_seconds):
+		frappe.db.set_single_value(
+			"Books Sync Settings",
+			{"pending_docs_page_size": page_size, "pending_docs_lease_seconds": lease_seconds},
+		)
+		frappe.clear_document_cache("Books Sync Settings", "Books Sync Settings")
+
+	def lease(self):
+		return [(row.document_type, row.document_name) for row in lease_queued_docs(TEST_INSTANCE)]
+
+	def get_row(self, doctype, name):
+		return frappe.db.get_value(
+			"Books Sync Queue",
+			{"books_instance": TEST_INSTANCE, "document_type": doctype, "document_name": name},
+			["name", "leased_until", "changed_while_leased"],
+			as_dict=True,
+		)
+
+	def test_leased_rows_are_skipped_until_the_lease_runs_out(self):
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+
+		self.assertEqual(self.lease(), [("UOM", "_Test Books UOM")])
+		self.assertEqual(self.lease(), [])
+
+		row = self.get_row("UOM", "_Test Books UOM")
+		frappe.db.set_value(
+			"Books Sync Queue", row.name, "leased_until", add_to_date(now_datetime(), seconds=-1)
+		)
+		self.assertEqual(self.lease(), [("UOM", "_Test Books UOM")])
+
+	def test_acknowledged_row_is_removed(self):
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		self.lease()
+
+		acknowledge_queued_doc(self.get_row("UOM", "_Test Books UOM").name)
+
+		self.assertIsNone(self.get_row("UOM", "_Test Books UOM"))
+
+	def test_row_changed_while_leased_is_sent_again(self):
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		self.lease()
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+
+		row = self.get_row("UOM", "_Test Books UOM")
+		self.assertTrue(row.changed_while_leased)
+
+		# the ack is for the version sent before the change
+		acknowledge_queued_doc(row.name)
+		row = self.get_row("UOM", "_Test Books UOM")
+		self.assertIsNotNone(row)
+		self.assertIsNone(row.leased_until)
+
+		self.assertEqual(self.lease(), [("UOM", "_Test Books UOM")])
+		self.assertFalse(self.get_row("UOM", "_Test Books UOM").changed_while_leased)
+
+		acknowledge_queued_doc(row.name)
+		self.assertIsNone(self.get_row("UOM", "_Test Books UOM"))
+
+	def test_unleased_row_is_not_marked_changed(self):
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+
+		self.assertFalse(self.get_row("UOM", "_Test Books UOM").changed_while_leased)
+
+	def test_rows_are_delivered_in_dependency_order(self):
+		queue_documents(TEST_INSTANCE, "Item", ["_Test Books Item"])
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		queue_documents(TEST_INSTANCE, "Item Group", ["_Test Books Item Group"])
+
+		doctypes = [doctype for doctype, _name in self.lease()]
+
+		self.assertEqual(doctypes, sorted(doctypes, key=OUTBOUND_DOCTYPES.index))
+		self.assertEqual(doctypes[-1], "Item")
+
+	def test_dependents_wait_for_leased_dependencies(self):
+		self.set_settings(page_size=1, lease_seconds=300)
+		queue_documents(TEST_INSTANCE, "Item", ["_Test Books Item"])
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		queue_documents(TEST_INSTANCE, "Item Group", ["_Test Books Item Group"])
+
+		first = self.lease()
+		second = self.lease()
+		self.assertEqual(
+			{first[0][0], second[0][0]}, {"UOM", "Item Group"}
+		)
+		# its UOM and Item Group are in flight
+		self.assertEqual(self.lease(), [])
+
+		acknowledge_queued_doc(self.get_row(*first[0]).name)
+		self.assertEqual(self.lease(), [])
+
+		acknowledge_queued_doc(self.get_row(*second[0]).name)
+		self.assertEqual(self.lease(), [("Item", "_Test Books Item")])
+
+	def test_expired_lease_no_longer_blocks_dependents(self):
+		self.set_settings(page_size=1, lease_seconds=300)
+		queue_documents(TEST_INSTANCE, "UOM", ["_Test Books UOM"])
+		queue_documents(TEST_INSTANCE, "Item", ["_Test Books Item"])
+
+		self.assertEqual(self.lease(), [("UOM", "_Test Books UOM")])
+		frappe.db.set_value(
+			"Books Sync Queue",
+			self.get_row("UOM", "_Test Books UOM").name,
+			"leased_until",
+			add_to_date(now_datetime(), seconds=-1),
+		)
+
+		# the UOM is handed out again ahead of the item that needs it
+		self.assertEqual(self.lease(), [("UOM", "_Test Books UOM")])
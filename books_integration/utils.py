@@ -1,7 +1,17 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+import base64
+import codecs
+import hashlib
+import json
+import re
+import zlib
+
 import frappe
+from frappe.utils import now_datetime
+from books_integration.reference_cache import reference_changed
+from pypika.terms import Values
 
 
 ERP_DOCTYPE_MAP = {
@@ -28,60 +38,139 @@ ERP_DOCTYPE_MAP = {
 
 BOOKS_DOCTYPE_MAP = {v: k for k, v in ERP_DOCTYPE_MAP.items()}
 
+COMPRESSED_PAYLOAD_PREFIX = "zlib:"
+PAYLOAD_CHUNK_SIZE = 64 * 1024
+# commas and brackets between the records of a JSON array, newlines between NDJSON lines
+RECORD_SEPARATORS = re.compile(r"[\s,\[\]]*")
+
 
 def get_doctype_name(doctype: str, target, doc=None):
     if not target:
         return
 
     if not doctype:
-        if not doc.get("doctype"):
+        if not doc or not doc.get("doctype"):
             return
         doctype = doc.get("doctype")
 
     if target == "erpn":
         if doc and doctype == "Party":
             return doc.get("role")
+        if doctype == "SalesInvoice":
+            return get_invoice_doctype()
         return BOOKS_DOCTYPE_MAP.get(doctype)
 
+    if doctype == "POS Invoice":
+        return "SalesInvoice"
+
     return ERP_DOCTYPE_MAP.get(doctype)
 
 
+def get_invoice_doctype():
+    """ERPNext doctype inbound Books invoices are created as."""
+    return frappe.get_cached_doc("Books Sync Settings").invoice_mode or "Sales Invoice"
+
+
 def update_books_reference(instance, reference):
-    doctype = get_doctype_name(
-        reference.get("doctype"), "erpn"
+    update_books_references(instance, [reference])
+
+
+def update_books_references(instance, references):
+    """Inserts or updates the Books References of many documents of an
+    instance with one statement, keyed on the document and instance."""
+    rows = {}
+    for reference in references:
+        row = get_reference_row(reference)
+        rows[(row.document_type, row.document_name)] = row
+
+    if not rows:
+        return
+
+    reference_changed(instance, *get_existing_references(instance, rows), *rows.values())
+
+    now = now_datetime()
+    table = frappe.qb.DocType("Books Reference")
+    query = frappe.qb.into(table).columns(
+        table.name,
+        table.document_type,
+        table.document_name,
+        table.books_instance,
+        table.books_name,
+        table.payload_hash,
+        table.field_hashes,
+        table.creation,
+        table.modified,
+        table.owner,
+        table.modified_by,
     )
-    existing_ref = frappe.db.get_value(
-        "Books Reference",
-        {
-            "document_type": doctype,
-            "document_name": reference.get("doc").get("itemCode") if doctype == "Item" else reference.get("name"),
-            "books_instance": instance,
-        },
-        ["books_name", "name"],
-        as_dict=True,
+    for row in rows.values():
+        query = query.insert(
+            frappe.generate_hash(length=10),
+            row.document_type,
+            row.document_name,
+            instance,
+            row.books_name,
+            row.payload_hash,
+            row.field_hashes,
+            now,
+            now,
+            frappe.session.user,
+            frappe.session.user,
+        )
+
+    # inbound and outbound updates each clear the hashes the other one keeps
+    update_fields = (
+        table.books_name,
+        table.payload_hash,
+        table.field_hashes,
+        table.modified,
+        table.modified_by,
     )
+    if frappe.db.db_type == "postgres":
+        query = query.on_conflict(table.document_type, table.document_name, table.books_instance)
+        for field in update_fields:
+            query = query.do_update(field)
+    else:
+        for field in update_fields:
+            query = query.on_duplicate_key_update(field, Values(field))
 
-    if not existing_ref:
-        frappe.get_doc(
-            {
-                "doctype": "Books Reference",
-                "document_type": doctype,
-                "document_name": reference.get("doc").get("itemCode") if doctype == "Item" else reference.get("name"),
-                "books_instance": instance,
-                "books_name": reference.get("books_name"),
-            },
-        ).insert()
-        return
+    query.run()
+
+
+def get_reference_row(reference):
+    doctype = reference.get("document_type") or get_doctype_name(reference.get("doctype"), "erpn")
+    document_name = reference.get("name")
+    if doctype == "Item":
+        # outbound items are referenced by item code, which may differ from the name
+        document_name = (reference.get("doc") or {}).get("itemCode") or document_name
+
+    return frappe._dict(
+        document_type=doctype,
+        document_name=document_name,
+        books_name=reference.get("books_name"),
+        payload_hash=reference.get("payload_hash"),
+        field_hashes=reference.get("field_hashes"),
+    )
 
-    if existing_ref.books_name == reference.get("books_name"):
-        return
 
-    if existing_ref.books_name != reference.get("books_name"):
-        frappe.db.set_value(
-            "Books Reference", existing_ref.name, "books_name", reference.get("books_name")
+def get_existing_references(instance, rows):
+    names_by_doctype = {}
+    for doctype, document_name in rows:
+        names_by_doctype.setdefault(doctype, []).append(document_name)
+
+    existing = []
+    for doctype, names in names_by_doctype.items():
+        existing += frappe.get_all(
+            "Books Reference",
+            filters={
+                "books_instance": instance,
+                "document_type": doctype,
+                "document_name": ("in", names),
+            },
+            fields=["document_type", "document_name", "books_name"],
         )
 
-    return
+    return existing
 
 
 def pretty_json(obj):
@@ -92,3 +181,104 @@ def pretty_json(obj):
         return obj
 
     return frappe.as_json(obj, indent=4)
+
+
+def compact_json(obj):
+    return frappe.as_json(obj, indent=None, separators=(",", ":"))
+
+
+def get_payload_hash(obj):
+    return hashlib.sha256(compact_json(obj).encode()).hexdigest()
+
+
+def compress_payload(obj):
+    """Returns `obj` as compact JSON, zlib compressed and base64 encoded
+    so it can be stored in a text column."""
+    if not obj:
+        return ""
+
+    if isinstance(obj, str):
+        if obj.startswith(COMPRESSED_PAYLOAD_PREFIX):
+            return obj
+        obj = json.loads(obj)
+
+    compressed = zlib.compress(compact_json(obj).encode())
+    return COMPRESSED_PAYLOAD_PREFIX + base64.b64encode(compressed).decode()
+
+
+def load_payload(value):
+    """Decodes a payload stored by `compress_payload` or plain JSON."""
+    if not value:
+        return None
+
+    if not isinstance(value, str):
+        return value
+
+    if value.startswith(COMPRESSED_PAYLOAD_PREFIX):
+        value = zlib.decompress(
+            base64.b64decode(value[len(COMPRESSED_PAYLOAD_PREFIX):])
+        )
+
+    return json.loads(value)
+
+
+def iter_payload(value):
+    """Yields the records of a payload stored by `compress_payload` or plain
+    JSON, decompressing and parsing it chunk by chunk."""
+    if not value:
+        return
+
+    if not isinstance(value, str):
+        yield from value
+        return
+
+    if not value.startswith(COMPRESSED_PAYLOAD_PREFIX):
+        yield from iter_json_records([value])
+        return
+
+    yield from iter_json_records(
+        decode_chunks(decompress_chunks(base64.b64decode(value[len(COMPRESSED_PAYLOAD_PREFIX):])))
+    )
+
+
+def decompress_chunks(data):
+    decompressor = zlib.decompressobj()
+    for start in range(0, len(data), PAYLOAD_CHUNK_SIZE):
+        yield decompressor.decompress(data[start:start + PAYLOAD_CHUNK_SIZE])
+
+    yield decompressor.flush()
+
+
+def decode_chunks(chunks):
+    # a multi-byte character may be split across chunks
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+
+    yield decoder.decode(b"", final=True)
+
+
+def iter_json_records(chunks):
+    """Yields the items of a JSON array, or the lines of newline delimited
+    JSON, read from an iterable of text chunks. Only the tail not parsed
+    yet is held in memory."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        pos = RECORD_SEPARATORS.match(buffer).end()
+        while pos < len(buffer):
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the record continues in the next chunk
+                break
+
+            yield record
+            pos = RECORD_SEPARATORS.match(buffer, pos).end()
+
+        buffer = buffer[pos:]
+
+    # anything left is a truncated or malformed record
+    if buffer:
+        decoder.raw_decode(buffer)